@@ -1,8 +1,13 @@
 # cache_builder.py
 import osmnx as ox
 import networkx as nx
-import pickle
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "notebook"))
+from city_cache import city_cache_path, migrate_legacy_city, save_city, fetch_pois_tiled
+from config import OSM_HTTP_CACHE_DIR, OSM_REQUEST_TIMEOUT
 
 CACHE_DIR = "city_cache"
 AVAILABLE_CITIES = [
@@ -13,6 +18,25 @@ AVAILABLE_CITIES = [
     "Amsterdam, Netherlands",
 ]
 
+MAX_DOWNLOAD_WORKERS = 5
+
+# Let OSMnx serve repeated Overpass queries from its on-disk HTTP cache (same settings as the app)
+ox.settings.use_cache = True
+ox.settings.cache_folder = OSM_HTTP_CACHE_DIR
+ox.settings.requests_timeout = OSM_REQUEST_TIMEOUT
+
+def _fetch_city(city_name):
+    """Download street network and attractions for one city (runs in a worker thread)."""
+    # Download graph
+    G = ox.graph_from_place(city_name, network_type="walk", simplify=True)
+    G = nx.Graph(G)
+    
+    # Download POIs (filtered for speed), tile by tile to bound peak memory
+    tags = {"tourism": ["museum", "attraction", "viewpoint"]}
+    pois = fetch_pois_tiled(city_name, tags)
+    
+    return G, pois
+
 def build_cache_for_all_cities():
     """Download and cache all cities at once."""
     
@@ -24,66 +48,71 @@ def build_cache_for_all_cities():
     print(f"This will download data for {len(AVAILABLE_CITIES)} cities.")
     print("⏳ Estimated time: 3-5 minutes total\n")
     
-    for i, city_name in enumerate(AVAILABLE_CITIES, 1):
-        print(f"\n[{i}/{len(AVAILABLE_CITIES)}] Processing {city_name}...")
-        
-        safe_name = city_name.replace(", ", "_").replace(" ", "_")
-        graph_cache = os.path.join(CACHE_DIR, f"{safe_name}_graph.pkl")
-        pois_cache = os.path.join(CACHE_DIR, f"{safe_name}_pois.pkl")
-        
-        # Skip if already cached
-        if os.path.exists(graph_cache) and os.path.exists(pois_cache):
-            print(f"  ✓ Already cached, skipping...")
+    # Skip cities that are already cached (one directory listing instead of a stat per city)
+    with os.scandir(CACHE_DIR) as entries:
+        existing = {entry.name for entry in entries}
+    
+    pending = []
+    for city_name in AVAILABLE_CITIES:
+        if os.path.basename(city_cache_path(CACHE_DIR, city_name)) in existing:
+            print(f"  ✓ {city_name}: already cached, skipping...")
             continue
         
+        # Caches from older releases (<city>_graph.pkl / <city>_pois.pkl) are converted, not downloaded again
         try:
-            # Download graph
-            print(f"  📥 Downloading street network...")
-            G = ox.graph_from_place(city_name, network_type="walk", simplify=True)
-            G = nx.Graph(G)
-            
-            # Download POIs (filtered for speed)
-            print(f"  📥 Downloading attractions...")
-            tags = {"tourism": ["museum", "attraction", "viewpoint"]}
-            pois = ox.features_from_place(city_name, tags=tags)
-            
-            if not pois.empty and "name" in pois.columns:
-                pois = pois[pois["name"].notna()].copy()
-            
-            # Save to cache
-            print(f"  💾 Saving to cache...")
-            with open(graph_cache, 'wb') as f:
-                pickle.dump(G, f)
-            with open(pois_cache, 'wb') as f:
-                pickle.dump(pois, f)
-            
-            # Get file sizes
-            graph_size = os.path.getsize(graph_cache) / (1024 * 1024)  # MB
-            pois_size = os.path.getsize(pois_cache) / (1024 * 1024)    # MB
-            
-            print(f"  ✓ Cached successfully!")
-            print(f"    - Graph: {len(G.nodes)} nodes ({graph_size:.1f} MB)")
-            print(f"    - POIs: {len(pois)} attractions ({pois_size:.1f} MB)")
-            
+            migrated = migrate_legacy_city(CACHE_DIR, city_name)
         except Exception as e:
-            print(f"  ❌ Error: {e}")
-            continue
+            print(f"  ⚠ {city_name}: could not convert old cache files ({e}), downloading again...")
+            migrated = None
+        if migrated:
+            print(f"  ✓ {city_name}: converted old cache files to {os.path.basename(migrated)}")
+        else:
+            pending.append(city_name)
+    
+    if pending:
+        print(f"\n📥 Downloading {len(pending)} cities in parallel...")
+    
+    # Downloads are network-bound, so overlap them; cache writes stay on this thread
+    with ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as executor:
+        futures = {executor.submit(_fetch_city, city_name): city_name for city_name in pending}
+        
+        for i, future in enumerate(as_completed(futures), 1):
+            city_name = futures[future]
+            print(f"\n[{i}/{len(pending)}] {city_name}")
+            
+            try:
+                G, pois = future.result()
+                
+                # Save to cache
+                print(f"  💾 Saving to cache...")
+                city_cache = city_cache_path(CACHE_DIR, city_name)
+                save_city(city_cache, G, pois)
+                
+                # Get file size
+                cache_size = os.path.getsize(city_cache) / (1024 * 1024)  # MB
+                
+                print(f"  ✓ Cached successfully! ({cache_size:.1f} MB)")
+                print(f"    - Graph: {len(G.nodes)} nodes")
+                print(f"    - POIs: {len(pois)} attractions")
+                
+            except Exception as e:
+                print(f"  ❌ Error: {e}")
+                continue
     
     print("\n" + "=" * 70)
     print("✓ CACHE BUILD COMPLETE!")
     print("=" * 70)
     
     # Show total cache size
-    total_size = 0
-    for file in os.listdir(CACHE_DIR):
-        file_path = os.path.join(CACHE_DIR, file)
-        total_size += os.path.getsize(file_path)
+    with os.scandir(CACHE_DIR) as entries:
+        total_size = sum(entry.stat().st_size for entry in entries if entry.is_file())
     
     total_size_mb = total_size / (1024 * 1024)
     print(f"\n📦 Total cache size: {total_size_mb:.1f} MB")
     print(f"📁 Cache location: {os.path.abspath(CACHE_DIR)}/")
     print(f"\n💡 You can now copy the '{CACHE_DIR}' folder to any computer!")
-    print(f"   Your main script will load instantly from these files.\n")
+    print(f"   Your main script will load instantly from its .bundle files")
+    print(f"   (old .pkl cache files are converted on first use and can then be deleted).\n")
 
 if __name__ == "__main__":
     build_cache_for_all_cities()
\ No newline at end of file
@@ -6,18 +6,28 @@ import streamlit as st
 import folium
 from streamlit_folium import st_folium
 import pandas as pd
-from datetime import datetime
+import numpy as np
+import threading
+import html
+import re
 import time
+from itertools import islice
+from functools import lru_cache
+from collections import deque
 
 # Import our modules (assumes these exist in the project)
 from path_planning import (
-    load_city_data,
+    load_city_graph_data,
+    load_city_pois_data,
     plan_time_based_tour,
     nearest_node,
+    get_nodes_lonlat,
+    simplify_lonlat,
     format_minutes,
 )
 from llm_tour_guide import TourGuideAgent, AttractionDatabase
-from config import AVAILABLE_CITIES, GEMINI_API_KEY
+from city_cache import city_cache_path, prewarm_bundles
+from config import AVAILABLE_CITIES, CACHE_DIR, GEMINI_API_KEY, MAX_A_STAR_EXPANSIONS, ROUTE_SMOOTH_FACTOR
 
 # =========================================
 # PAGE CONFIGURATION
@@ -265,22 +275,25 @@ div[data-testid="stVerticalBlock"] > div[role="list"] {
 # SESSION STATE INITIALIZATION
 # ==========================================
 
+# Most recent chat messages kept in the conversation panel
+MAX_CHAT_MESSAGES = 100
+
 # Initialize all session states
 session_keys = {
     'tour_planned': False,
     'current_stop': 0,
     'show_tips': {},
     'user_questions': {},
-    'conversation_history': [],
-    'attractions_cache': {},
-    'current_city': None,
-    'city_data': None,
+    'conversation_history': deque(maxlen=MAX_CHAT_MESSAGES),
     'G': None,
     'pois': None,
     'city_name': None,
     'itinerary': None,
+    'leg_by_start': {},
     'route_nodes': None,
+    'route_lonlat': None,
     'stops_info': None,
+    'stops_lonlat': None,
     'total_distance': 0,
     'total_time': 0,
     'direct_route_info': None,
@@ -292,169 +305,282 @@ for key, default_value in session_keys.items():
     if key not in st.session_state:
         st.session_state[key] = default_value
 
+@st.cache_resource(show_spinner=False)
+def _start_bundle_prewarm():
+    """
+    Warm the OS page cache with every city bundle so the first city pick doesn't stall on disk.
+    Cached as a resource so the thread starts once per process, not once per session.
+    """
+    bundle_paths = [city_cache_path(CACHE_DIR, c) for c in AVAILABLE_CITIES]
+    thread = threading.Thread(target=prewarm_bundles, args=(bundle_paths,), daemon=True)
+    thread.start()
+    return thread
+
+_start_bundle_prewarm()
+
 # ==========================================
 # CACHED DATA LOADING
 # ==========================================
 
-@st.cache_data(show_spinner=False)
-def cached_load_city_data(city_name):
-    """Cached version of city data loading"""
-    return load_city_data(city_name)
-
-def load_city_attractions(city_name):
-    """Load and cache attractions for a city with session persistence"""
-    # Return cached if available in session
-    if city_name in st.session_state.attractions_cache:
-        return st.session_state.attractions_cache[city_name]
-
-    try:
-        result = cached_load_city_data(city_name)
-
-        # Validate return format
-        if not isinstance(result, tuple) or len(result) != 2:
-            st.error("Unexpected return format from load_city_data (expected (G, pois)).")
-            return None
-
-        G, pois = result
-
-        # Validate types
-        if pois is None:
-            st.error("No POIs returned for this city.")
-            return None
-
-        # Handle GeoDataFrame appropriately
-        try:
-            pois_df = pois
-            if hasattr(pois_df, "empty"):
-                if pois_df.empty:
-                    st.error("No points of interest found for this city.")
-                    return None
-            else:
-                pois_df = pd.DataFrame(pois)
-                if pois_df.shape[0] == 0:
-                    st.error("No points of interest found for this city.")
-                    return None
-        except Exception:
-            pois_df = pd.DataFrame(pois)
-            if pois_df.shape[0] == 0:
-                st.error("No points of interest found for this city.")
-                return None
-
-        # Extract names
-        name_cols = [c for c in pois_df.columns if c.lower() == 'name']
-        if not name_cols:
-            if 'display_name' in pois_df.columns:
-                raw_names = pois_df['display_name'].astype(str).fillna('')
-            elif 'tags' in pois_df.columns:
-                def _extract_from_tags(v):
-                    try:
-                        if isinstance(v, dict):
-                            return v.get('name') or v.get('official_name') or v.get('alt_name') or str(v)
-                        return str(v)
-                    except Exception:
-                        return str(v)
-                raw_names = pois_df['tags'].apply(_extract_from_tags).astype(str).fillna('')
-            else:
-                if 'osm_id' in pois_df.columns and 'geometry' in pois_df.columns:
-                    raw_names = pois_df['osm_id'].astype(str)
-                else:
-                    raw_names = pois_df.iloc[:, 0].astype(str).fillna('')
-        else:
-            raw_names = pois_df[name_cols[0]].astype(str).fillna('')
+# Cap on dropdown size; the full list is reached through the search box
+MAX_ATTRACTION_OPTIONS = 50
 
-        # Clean and dedupe names
-        attractions = sorted({n.strip() for n in raw_names if n and n.strip()})
+# Granularity of the time budget slider (minutes); planned tours are cached per step
+PLAN_TIME_STEP = 15
 
-        # Cache the data in session
-        st.session_state.attractions_cache[city_name] = {
-            'G': G,
-            'pois': pois_df,
-            'attractions': attractions
-        }
+def extract_attraction_names(pois_df):
+    """Sorted, de-duplicated attraction names from a POI frame"""
+    # OSMnx flattens tags into columns, so 'name' is all we need
+    if 'name' in pois_df.columns:
+        names = pois_df['name'].astype('string').str.strip()
+    else:
+        names = pd.Series(dtype='string')
+
+    # Clean and dedupe names
+    names = names[names.notna() & (names != '')]
+    unique_names = np.asarray(pd.unique(names), dtype=str)  # hash-based dedupe
+    return np.sort(unique_names).tolist()  # fixed-width unicode sort, no PyObject compares
+
+@st.cache_resource(show_spinner=False)
+def _get_graph(city_name):
+    """Street graph for a city, one shared instance per process (never hashed or copied)"""
+    G = load_city_graph_data(city_name)
+    if G is None:
+        raise ValueError(f"No street network returned for {city_name}.")
+    return G
+
+@st.cache_resource(show_spinner=False)
+def _get_pois(city_name):
+    """
+    POI frame for a city, shared read-only by every session.
+    Kept in cache_resource rather than cache_data: the planner and guide only read it,
+    and cache_data would unpickle a fresh GeoDataFrame copy on every rerun.
+    """
+    pois = load_city_pois_data(city_name)
+    if pois is None:
+        raise ValueError(f"No data returned for {city_name}.")
+    if pois.empty:
+        raise ValueError("No points of interest found for this city.")
+    return pois
 
-        return st.session_state.attractions_cache[city_name]
+@st.cache_data(show_spinner=False)
+def _get_attractions(city_name):
+    """Sorted attraction names plus (name, lowercased name) pairs for sidebar search"""
+    attractions = extract_attraction_names(_get_pois(city_name))
+    return attractions, [(a, a.lower()) for a in attractions]
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _plan_tour_cached(city_name, start_location, end_location, time_bucket):
+    """
+    Plan a tour once per (city, start, end, time bucket); re-clicks are served from cache.
+    Keyed on the city name so the graph itself is never hashed.
+    """
+    return plan_time_based_tour(
+        _get_graph(city_name), _get_pois(city_name),
+        start_location, end_location,
+        time_bucket,
+        max_expansions=MAX_A_STAR_EXPANSIONS
+    )
+
+def _get_city_bundle(city_name):
+    """
+    POIs and attraction names for the sidebar. Each piece is cached on its own;
+    the street graph is only decoded when a tour is planned (see _get_graph).
+    Failures raise instead of returning None so they are not cached.
+    """
+    attractions, attractions_lower = _get_attractions(city_name)
+    return {
+        'pois': _get_pois(city_name),
+        'attractions': attractions,
+        'attractions_lower': attractions_lower
+    }
 
-    except Exception as e:
-        st.error(f"Error loading city data: {str(e)}")
-        return None
+def search_attractions(city_data, query, limit=MAX_ATTRACTION_OPTIONS):
+    """First `limit` attractions whose name contains `query` (case-insensitive)"""
+    query = (query or "").strip().lower()
+    if not query:
+        return city_data['attractions'][:limit]
+    matches = (name for name, lower in city_data['attractions_lower'] if query in lower)
+    return list(islice(matches, limit))
 
 # ==========================================
 # HELPER FUNCTIONS
 # ==========================================
 
-def create_tour_map(G, route_nodes, stops_info, city_name, highlight_stop=None):
-    """Create an interactive Folium map with the tour route and highlighted current stop."""
-    if not route_nodes:
-        try:
-            any_node = next(iter(G.nodes))
-            center_lat = G.nodes[any_node].get('y')
-            center_lon = G.nodes[any_node].get('x')
-        except Exception:
-            center_lat, center_lon = 0, 0
+@st.cache_resource(show_spinner=False, max_entries=8)
+def build_map_layers(route_lonlat, stops_info, stops_lonlat, city_name):
+    """
+    Static content of the tour map, computed once per planned tour: the map centre,
+    the simplified route line and one (location, popup, tooltip, color, icon) per stop.
+    Coordinates come in as precomputed (lon, lat) arrays from tour planning time.
+    """
+    if len(route_lonlat):
+        center_lon, center_lat = route_lonlat[len(route_lonlat)//2]
+    elif len(stops_lonlat):
+        center_lon, center_lat = stops_lonlat[0]
     else:
-        center_node = route_nodes[len(route_nodes)//2]
-        center_lat = G.nodes[center_node].get('y')
-        center_lon = G.nodes[center_node].get('x')
-
-    m = folium.Map(location=[center_lat, center_lon], zoom_start=14, tiles='OpenStreetMap')
-
-    try:
-        route_coords = [(G.nodes[node]['y'], G.nodes[node]['x']) for node in route_nodes]
-        folium.PolyLine(route_coords, color='#007BFF', weight=5, opacity=0.8, popup='Tour Route').add_to(m)
-    except Exception:
-        pass
+        center_lat, center_lon = AVAILABLE_CITIES.get(city_name, (0, 0))
+
+    route_coords = []
+    if len(route_lonlat) > 1:
+        route_coords = simplify_lonlat(route_lonlat)[:, ::-1].tolist()  # Folium wants (lat, lon)
+
+    # Marker styles decided up front; the loop below just indexes into them
+    n_stops = len(stops_info)
+    colors = ['blue'] * n_stops
+    icons = ['info-sign'] * n_stops
+    if n_stops:
+        colors[-1], icons[-1] = 'red', 'stop'
+        colors[0], icons[0] = 'green', 'play'
+
+    markers = [
+        ([lat, lon], f"<b>Stop {idx + 1}</b><br>{stop_name}", f"{idx + 1}. {stop_name}", colors[idx], icons[idx])
+        for idx, ((stop_name, _), (lon, lat)) in enumerate(zip(stops_info, stops_lonlat.tolist()))
+    ]
+    return [float(center_lat), float(center_lon)], route_coords, markers
+
+def build_base_map(route_lonlat, stops_info, stops_lonlat, city_name):
+    """
+    Tour map without the current-stop highlight: tiles, route line and every stop marker.
+    st_folium renders into and renames the elements of the map it is given, so every
+    rerun gets a new map, assembled from the cached layers rather than copied.
+    """
+    center, route_coords, markers = build_map_layers(route_lonlat, stops_info, stops_lonlat, city_name)
+
+    m = folium.Map(location=center, zoom_start=14, tiles='OpenStreetMap')
+
+    if route_coords:
+        folium.PolyLine(route_coords, color='#007BFF', weight=5, opacity=0.8, popup='Tour Route',
+                        smooth_factor=ROUTE_SMOOTH_FACTOR).add_to(m)
+
+    for location, popup, tooltip, color, icon in markers:
+        folium.Marker(location=location, popup=popup, tooltip=tooltip,
+                      icon=folium.Icon(color=color, icon=icon)).add_to(m)
+    return m
 
-    for idx, (stop_name, node_id) in enumerate(stops_info, 1):
-        try:
-            lat = G.nodes[node_id]['y']
-            lon = G.nodes[node_id]['x']
-        except Exception:
-            continue
-
-        is_highlighted = (highlight_stop is not None and idx - 1 == highlight_stop)
-
-        if is_highlighted:
-            color = 'orange'
-            icon = 'star'
-        elif idx == 1:
-            color = 'green'
-            icon = 'play'
-        elif idx == len(stops_info):
-            color = 'red'
-            icon = 'stop'
-        else:
-            color = 'blue'
-            icon = 'info-sign'
-
-        marker = folium.Marker(
-            location=[lat, lon],
-            popup=f"<b>Stop {idx}</b><br>{stop_name}",
-            tooltip=(f"{'⭐ CURRENT: ' if is_highlighted else ''}{idx}. {stop_name}"),
-            icon=folium.Icon(color=color, icon=icon)
-        )
-        marker.add_to(m)
+def overlay_highlight(stops_info, stops_lonlat, highlight_stop):
+    """Feature group drawing the current-stop marker and halo on top of the base map."""
+    fg = folium.FeatureGroup(name='Current stop')
+    if highlight_stop is None or not 0 <= highlight_stop < len(stops_info):
+        return fg
+
+    stop_name = stops_info[highlight_stop][0]
+    lon, lat = stops_lonlat[highlight_stop].tolist()
+
+    folium.Marker(
+        location=[lat, lon],
+        popup=f"<b>Stop {highlight_stop + 1}</b><br>{stop_name}",
+        tooltip=f"⭐ CURRENT: {highlight_stop + 1}. {stop_name}",
+        icon=folium.Icon(color='orange', icon='star')
+    ).add_to(fg)
+    folium.Circle(location=[lat, lon], radius=100, color='#FFC107', fill=True,
+                  fillColor='#FFC107', fillOpacity=0.2, weight=3).add_to(fg)
+    return fg
+
+def render_tour_map():
+    """
+    Render the tour map. The map layers are cached per tour; only the
+    highlight layer changes between stops, so st_folium updates it in place.
+    """
+    tour_map = build_base_map(
+        st.session_state.route_lonlat,
+        st.session_state.stops_info,
+        st.session_state.stops_lonlat,
+        st.session_state.city_name
+    )
+    highlight = overlay_highlight(
+        st.session_state.stops_info,
+        st.session_state.stops_lonlat,
+        st.session_state.current_stop
+    )
+
+    st_folium(tour_map, width=700, height=700, key="tour_map",
+              feature_group_to_add=highlight, returned_objects=[], render=False)
+
+# Static page fragments, built once at import
+HERO_HTML = """
+<div class="hero">
+  <div style="text-align:center">
+    <h1>Discover Cities with AI</h1>
+    <p>Personalized city tours optimized for your time and interests.</p>
+  </div>
+</div>
+"""
+
+# Tour stats as one flex row of three boxes (a single Streamlit element)
+STATS_HTML = (
+    '<div style="display:flex;gap:1rem;">'
+    '<div class="stats-box" style="flex:1;"><h3>📍 {n_stops}</h3><p>Total Stops</p></div>'
+    '<div class="stats-box" style="flex:1;"><h3>🚶 {distance:.2f} km</h3><p>Total Distance</p></div>'
+    '<div class="stats-box" style="flex:1;"><h3>⏰ {duration}</h3><p>Total Time</p></div>'
+    '</div>'
+)
 
-        if is_highlighted:
-            folium.Circle(location=[lat, lon], radius=100, color='#FFC107', fill=True,
-                          fillColor='#FFC107', fillOpacity=0.2, weight=3).add_to(m)
+# Progress pill per stop state: (CSS class from the theme above, label prefix)
+PROGRESS_STATES = {
+    'completed': ('progress-step completed', '✓ '),
+    'current': ('progress-step current', '📍 '),
+    'pending': ('progress-step pending', ''),
+}
 
-    return m
+@lru_cache(maxsize=64)
+def build_progress_html(current_idx, n_stops):
+    """Progress indicator HTML for a tour of n_stops with current_idx active."""
+    parts = ['<div class="progress-indicator">']
+    for i in range(n_stops):
+        state = 'completed' if i < current_idx else 'current' if i == current_idx else 'pending'
+        css_class, prefix = PROGRESS_STATES[state]
+        parts.append(f'<span class="{css_class}">{prefix}Stop {i+1}</span>')
+    parts.append('</div>')
+    return "".join(parts)
 
 def add_chat_message(role, message):
     """Add a message to the conversation history."""
     st.session_state.conversation_history.append({
         'role': role,
         'message': message,
-        'timestamp': datetime.now()
+        'timestamp': time.monotonic_ns()  # ordering only; no wall-clock needed
     })
 
+# Chat bubble template per role: (CSS class, speaker label)
+CHAT_ROLES = {
+    'guide': ('chat-message guide', 'Guide'),
+    'user': ('chat-message user', 'You'),
+}
+
+# Inline markdown used by the guide's messages (bold, italic, bullets), applied after escaping
+MD_BOLD = re.compile(r"\*\*(?!\s)(.+?)(?<!\s)\*\*")
+MD_ITALIC = re.compile(r"(?<![\w*])([*_])(?![\s*_])(.+?)(?<![\s*_])\1(?![\w*])")
+MD_BULLET = re.compile(r"^[ \t]*[-*][ \t]+", re.MULTILINE)
+
+def _markdown_to_html(text):
+    """Escape text, then turn its inline markdown into HTML tags."""
+    text = MD_BULLET.sub("• ", html.escape(text))
+    text = MD_BOLD.sub(r"<strong>\1</strong>", text)
+    return MD_ITALIC.sub(r"<em>\2</em>", text)
+
+def _msg_to_html(msg):
+    """
+    One chat bubble as a single line of HTML. The whole block is raw HTML, so
+    Streamlit does not parse markdown inside it: the guide's markdown is
+    converted here, while what the user typed is only escaped.
+    """
+    css_class, speaker = CHAT_ROLES.get(msg['role'], CHAT_ROLES['user'])
+    if msg['role'] == 'guide':
+        text = _markdown_to_html(msg['message'])
+    else:
+        text = html.escape(msg['message'])
+    text = text.replace("\n", "<br>")
+    return (f'<div class="{css_class}"><div style="font-weight:700;">{speaker}</div>'
+            f'<div>{text}</div></div>')
+
 def reset_tour():
     """Reset the tour to start over."""
     st.session_state.tour_planned = False
     st.session_state.current_stop = 0
     st.session_state.show_tips = {}
     st.session_state.user_questions = {}
-    st.session_state.conversation_history = []
+    st.session_state.conversation_history = deque(maxlen=MAX_CHAT_MESSAGES)
 
 # ==========================================
 # MAIN APP
@@ -462,14 +588,7 @@ def reset_tour():
 
 def main():
     # HERO SECTION
-    st.markdown("""
-    <div class="hero">
-      <div style="text-align:center">
-        <h1>Discover Cities with AI</h1>
-        <p>Personalized city tours optimized for your time and interests.</p>
-      </div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(HERO_HTML, unsafe_allow_html=True)
 
     # ==========================================
     # SIDEBAR - TOUR PLANNING
@@ -485,45 +604,51 @@ def main():
             key="city_selector"
         )
 
-        # Load attractions for the selected city (only once per session)
-        if city_name != st.session_state.current_city:
-            st.session_state.current_city = city_name
+        # POIs and attraction names come from per-piece Streamlit caches shared across sessions
+        try:
             with st.spinner(f"🔄 Loading {city_name} attractions..."):
-                city_data = load_city_attractions(city_name)
-                if city_data:
-                    st.success(f"✅ Loaded {len(city_data['attractions'])} attractions!")
-                    time.sleep(0.4)
-                    # Store in session state
-                    st.session_state.city_data = city_data
-
-        # Access cached data safely
-        city_data = st.session_state.attractions_cache.get(city_name)
-        if city_data and isinstance(city_data, dict) and 'attractions' in city_data:
+                city_data = _get_city_bundle(city_name)
+        except Exception as e:
+            st.error(f"Error loading city data: {str(e)}")
+            city_data = None
+
+        if city_data:
             attractions_list = city_data['attractions']
             st.markdown(f'<div class="loading-badge">✓ {len(attractions_list)} attractions loaded</div>', unsafe_allow_html=True)
 
-            # Starting point - searchable selectbox
+            # Starting point - search box feeding a capped selectbox
             st.markdown("**📍 Starting point**")
+            start_query = st.text_input(
+                "Search starting point:",
+                placeholder="Type to search...",
+                key="start_query"
+            )
             start_location = st.selectbox(
-                "Select or search starting point:",
-                options=[""] + attractions_list,
-                format_func=lambda x: "Type to search..." if x == "" else x,
+                "Select starting point:",
+                options=search_attractions(city_data, start_query),
+                index=None,
+                placeholder="Choose a starting point",
                 key="start_select",
-                help="Click and type to search"
+                help=f"Showing up to {MAX_ATTRACTION_OPTIONS} matches"
             )
 
-            # Destination - searchable selectbox
+            # Destination - search box feeding a capped selectbox
             st.markdown("**🏁 Final stop**")
+            end_query = st.text_input(
+                "Search destination:",
+                placeholder="Type to search...",
+                key="end_query"
+            )
             end_location = st.selectbox(
-                "Select or search destination:",
-                options=[""] + attractions_list,
-                format_func=lambda x: "Type to search..." if x == "" else x,
+                "Select destination:",
+                options=search_attractions(city_data, end_query),
+                index=None,
+                placeholder="Choose a destination",
                 key="end_select",
-                help="Click and type to search"
+                help=f"Showing up to {MAX_ATTRACTION_OPTIONS} matches"
             )
 
         else:
-            st.warning("⏳ Loading city data, please wait...")
             start_location = None
             end_location = None
 
@@ -533,7 +658,7 @@ def main():
             min_value=30,
             max_value=480,
             value=180,
-            step=15,
+            step=PLAN_TIME_STEP,
             help="Includes walking and visit time",
             key="time_slider"
         )
@@ -549,20 +674,15 @@ def main():
             else:
                 with st.spinner(f"🔍 Planning your tour in {city_name}..."):
                     try:
-                        # Use cached data
-                        city_data = st.session_state.attractions_cache.get(city_name)
                         if not city_data:
                             st.error("City data not loaded. Please wait and try again.")
                         else:
-                            G = city_data['G']
+                            G = _get_graph(city_name)
                             pois = city_data['pois']
 
-                            # Plan tour
-                            result = plan_time_based_tour(
-                                G, pois,
-                                start_location, end_location,
-                                available_time
-                            )
+                            # Plan tour (time snapped to the slider step so equal requests share a cache entry)
+                            time_bucket = int(round(available_time / PLAN_TIME_STEP) * PLAN_TIME_STEP)
+                            result = _plan_tour_cached(city_name, start_location, end_location, time_bucket)
 
                             if not result:
                                 st.error("❌ Could not plan tour. Check inputs or try different time.")
@@ -575,8 +695,11 @@ def main():
                                 st.session_state.pois = pois
                                 st.session_state.city_name = city_name
                                 st.session_state.itinerary = itinerary
+                                st.session_state.leg_by_start = {leg[0].lower(): leg for leg in reversed(itinerary)}  # first leg wins
                                 st.session_state.route_nodes = route_nodes
                                 st.session_state.stops_info = stops_info
+                                st.session_state.route_lonlat = get_nodes_lonlat(G, route_nodes)
+                                st.session_state.stops_lonlat = get_nodes_lonlat(G, [node for _, node in stops_info])
                                 st.session_state.total_distance = total_distance
                                 st.session_state.total_time = total_time
                                 st.session_state.direct_route_info = direct_route_info
@@ -587,14 +710,13 @@ def main():
 
                                 st.session_state.tour_planned = True
                                 st.session_state.current_stop = 0
-                                st.session_state.conversation_history = []
+                                st.session_state.conversation_history = deque(maxlen=MAX_CHAT_MESSAGES)
 
                                 # Welcome message
                                 welcome = st.session_state.guide.generate_welcome_message()
                                 add_chat_message('guide', welcome)
 
-                                st.success("✅ Tour planned successfully!")
-                                time.sleep(0.4)
+                                st.toast("Tour planned successfully!", icon="✅")
                     except Exception as e:
                         st.error(f"❌ Error: {str(e)}")
 
@@ -657,13 +779,12 @@ def main():
                     if current_idx < len(stops) - 1:
                         if st.button("➡️ Next Stop", key=f"next_btn_{current_idx}", type="primary"):
                             try:
-                                directions = None
-                                for leg_start, leg_end, dist, walk_time, visit_time, attr in st.session_state.itinerary:
-                                    if leg_start.lower() == current_stop_name.lower():
-                                        directions = st.session_state.guide.get_walking_directions(leg_start, leg_end, dist, walk_time)
-                                        add_chat_message('user', "I'm ready to go to the next stop!")
-                                        add_chat_message('guide', f"Great! Let's head to **{leg_end}**.\n\n🚶 **Distance:** {dist:.2f} km\n⏱️ **Time:** ~{int(walk_time)} minutes\n\n{directions}")
-                                        break
+                                leg = st.session_state.leg_by_start.get(current_stop_name.lower())
+                                if leg:
+                                    leg_start, leg_end, dist, walk_time, visit_time, attr = leg
+                                    directions, _ = st.session_state.guide.get_next_stop_guidance(leg_start, leg_end, dist, walk_time)
+                                    add_chat_message('user', "I'm ready to go to the next stop!")
+                                    add_chat_message('guide', f"Great! Let's head to **{leg_end}**.\n\n🚶 **Distance:** {dist:.2f} km\n⏱️ **Time:** ~{int(walk_time)} minutes\n\n{directions}")
                                 st.session_state.current_stop += 1
                             except Exception as e:
                                 add_chat_message('guide', f"Could not compute next leg: {str(e)}")
@@ -693,40 +814,15 @@ def main():
                         add_chat_message('guide', answer)
 
             # Now render the map below the controls
-            tour_map = create_tour_map(
-                st.session_state.G,
-                st.session_state.route_nodes,
-                st.session_state.stops_info,
-                st.session_state.city_name,
-                highlight_stop=st.session_state.current_stop
-            )
-
-            st_folium(tour_map, width=700, height=700, key=f"map_{st.session_state.current_stop}")
+            render_tour_map()
 
             # Stats
             st.markdown("---")
-            stats_col1, stats_col2, stats_col3 = st.columns(3)
-            with stats_col1:
-                st.markdown(f"""
-                    <div class="stats-box">
-                        <h3>📍 {len(st.session_state.stops)}</h3>
-                        <p>Total Stops</p>
-                    </div>
-                """, unsafe_allow_html=True)
-            with stats_col2:
-                st.markdown(f"""
-                    <div class="stats-box">
-                        <h3>🚶 {st.session_state.total_distance:.2f} km</h3>
-                        <p>Total Distance</p>
-                    </div>
-                """, unsafe_allow_html=True)
-            with stats_col3:
-                st.markdown(f"""
-                    <div class="stats-box">
-                        <h3>⏰ {format_minutes(st.session_state.total_time)}</h3>
-                        <p>Total Time</p>
-                    </div>
-                """, unsafe_allow_html=True)
+            st.markdown(STATS_HTML.format(
+                n_stops=len(st.session_state.stops),
+                distance=st.session_state.total_distance,
+                duration=format_minutes(st.session_state.total_time)
+            ), unsafe_allow_html=True)
 
         with chat_col:
             st.markdown("<div class='section-title'>💬 Your AI Guide</div>", unsafe_allow_html=True)
@@ -735,34 +831,14 @@ def main():
             current_idx = st.session_state.current_stop
             stops = st.session_state.stops
 
-            progress_html = '<div style="margin-bottom:0.6rem">'
-            for i in range(len(stops)):
-                if i < current_idx:
-                    progress_html += f'<span style="margin-right:6px;padding:0.5rem 1rem;border-radius:999px;background:#28a745;color:white;font-weight:700;">✓ Stop {i+1}</span>'
-                elif i == current_idx:
-                    progress_html += f'<span style="margin-right:6px;padding:0.5rem 1rem;border-radius:999px;background:#007BFF;color:white;font-weight:700;">📍 Stop {i+1}</span>'
-                else:
-                    progress_html += f'<span style="margin-right:6px;padding:0.5rem 1rem;border-radius:999px;background:#E9ECEF;color:#6C757D;font-weight:700;">Stop {i+1}</span>'
-            progress_html += '</div>'
+            progress_html = build_progress_html(current_idx, len(stops))
             st.markdown(progress_html, unsafe_allow_html=True)
 
             # Conversation history
             st.markdown("---")
-            for msg in st.session_state.conversation_history:
-                if msg['role'] == 'guide':
-                    st.markdown(f"""
-                        <div class="chat-message guide">
-                            <div style="font-weight:700;">Guide</div>
-                            <div>{msg['message']}</div>
-                        </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                        <div class="chat-message user">
-                            <div style="font-weight:700;">You</div>
-                            <div>{msg['message']}</div>
-                        </div>
-                    """, unsafe_allow_html=True)
+            chat_html = "".join(_msg_to_html(msg) for msg in st.session_state.conversation_history)
+            if chat_html:
+                st.markdown(chat_html, unsafe_allow_html=True)
 
             # Current stop details on the right
             current_stop_name = stops[current_idx]
@@ -773,13 +849,11 @@ def main():
                 </div>
             """, unsafe_allow_html=True)
 
-            with st.spinner("Loading attraction details..."):
-                try:
-                    description = st.session_state.guide.describe_attraction(current_stop_name)
-                except Exception as e:
-                    description = f"Description not available: {str(e)}"
-
-            st.markdown(f'<div style="white-space:pre-wrap;color:white;">{description}</div>', unsafe_allow_html=True)
+            # Stream the description so the first words show up while the rest is generated
+            try:
+                st.write_stream(st.session_state.guide.stream_description(current_stop_name))
+            except Exception as e:
+                st.markdown(f"Description not available: {str(e)}")
             
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -25,6 +25,12 @@ AVAILABLE_CITIES = {
 
 CACHE_DIR = "city_cache"
 
+# On-disk cache of raw Overpass/Nominatim HTTP responses (used by OSMnx)
+OSM_HTTP_CACHE_DIR = "osmnx_http_cache"
+
+# Timeout for OpenStreetMap API requests (seconds)
+OSM_REQUEST_TIMEOUT = 300
+
 # ==========================================
 # TOUR PLANNING PARAMETERS
 # ==========================================
@@ -47,16 +53,23 @@ MIN_ATTRACTION_SCORE = 0.3
 # Maximum attractions per tour
 MAX_ATTRACTIONS_PER_TOUR = 15
 
+# Score multiplier per tourism type (any other type gets 1.0)
+TOURISM_TYPE_BONUS = {"museum": 1.5, "gallery": 1.5, "attraction": 1.3, "viewpoint": 1.3}
+
 # ==========================================
 # A* ALGORITHM PARAMETERS
 # ==========================================
 
 # Weight for attraction scoring (higher = prefer popular attractions)
-ATTRACTION_WEIGHT = 1.5
+# The bonus is earned on every node of a route, so it stays small next to km walked
+ATTRACTION_WEIGHT = 0.05
 
 # Heuristic weight for A* (higher = faster but less optimal)
 HEURISTIC_WEIGHT = 1.2
 
+# Maximum node expansions per A* leg before giving up
+MAX_A_STAR_EXPANSIONS = 30000
+
 # ==========================================
 # VISUALIZATION SETTINGS
 # ==========================================
@@ -67,6 +80,12 @@ DEFAULT_MAP_ZOOM = 13
 # Map tile style
 MAP_TILES = "OpenStreetMap"
 
+# Route lines are simplified before drawing (Douglas-Peucker tolerance in degrees, ~1 m)
+ROUTE_SIMPLIFY_TOLERANCE_DEG = 1e-5
+
+# Leaflet's own line simplification at each zoom level (higher = fewer drawn points)
+ROUTE_SMOOTH_FACTOR = 3.0
+
 # Output file for static maps
 MAP_OUTPUT_FILE = "tour_map.html"
 
@@ -78,4 +97,10 @@ MAP_OUTPUT_FILE = "tour_map.html"
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 # LLM model
-LLM_MODEL = "gemini-2.5-flash"
\ No newline at end of file
+LLM_MODEL = "gemini-2.5-flash"
+
+# On-disk cache of generated texts, shared across sessions and restarts (needs diskcache)
+LLM_CACHE_DIR = "llm_cache"
+
+# How long a cached LLM response stays valid (seconds)
+LLM_CACHE_TTL = 30 * 24 * 3600
\ No newline at end of file
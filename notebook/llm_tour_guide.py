@@ -4,16 +4,153 @@
 # Uses Google Gemini for natural language generation
 # ==========================================
 
-import google.generativeai as genai
-from config import GEMINI_API_KEY, LLM_MODEL
+from config import GEMINI_API_KEY, LLM_MODEL, LLM_CACHE_DIR, LLM_CACHE_TTL
+from functools import lru_cache
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import re
 import sys
+import threading
+import hashlib
+
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    print("⚠ Warning: diskcache not found. LLM responses will only be cached in memory.")
+    DISKCACHE_AVAILABLE = False
 
 print("✓ LLM tour guide module loaded successfully.")
 
+# Most recent conversation turns kept per guide (older ones are dropped)
+MAX_CONVERSATION_HISTORY = 200
+
+# Offline question classifier: topics in priority order, each matched anywhere in
+# the question ("photography", "eating" and "pricey" count); the first topic found wins
+_FALLBACK_TOPICS = [
+    ('photo', re.compile(r"photo|picture|camera", re.IGNORECASE)),
+    ('time', re.compile(r"time|long|hours", re.IGNORECASE)),
+    ('price', re.compile(r"ticket|price|cost|fee", re.IGNORECASE)),
+    ('food', re.compile(r"food|eat|restaurant|cafe", re.IGNORECASE)),
+]
+_FALLBACK_RESPONSES = {
+    'photo': lambda a: f"📸 Great question! The best photo spots at {a} are usually near the main entrance or facade. Early morning or late afternoon light works best!",
+    'time': lambda a: f"⏰ Most visitors spend 15-30 minutes at {a}. Take your time to fully appreciate it!",
+    'price': lambda a: f"💰 For current ticket prices and booking information for {a}, I recommend checking their official website or asking at the entrance.",
+    'food': lambda a: f"🍽️ There are usually cafes and restaurants near {a}. Look for local spots just off the main tourist areas for better value!",
+}
+
+# Number of generated texts (descriptions, tips, directions) kept in memory
+LLM_CACHE_SIZE = 512
+
+# Gemini calls are network-bound, so independent ones run side by side
+_llm_pool = ThreadPoolExecutor(max_workers=3)
+
+
+@lru_cache(maxsize=4)
+def _get_gemini_model(model_name):
+    """
+    Configure Gemini once and share one model client per model name.
+    The SDK is imported here, on first use, since it is slow to import.
+    """
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(model_name)
+
+
+# Generated texts keyed by (model name, prompt), least recently used evicted first
+_llm_cache = OrderedDict()
+_llm_cache_lock = threading.Lock()
+
+
+# Second tier on disk, so generated texts survive restarts and redeploys
+_llm_disk_cache = diskcache.Cache(LLM_CACHE_DIR) if DISKCACHE_AVAILABLE else None
+
+
+def _disk_key(key):
+    """Stable on-disk key for a (model name, prompt) pair."""
+    model_name, prompt = key
+    return hashlib.sha1(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def _memory_put(key, text):
+    with _llm_cache_lock:
+        _llm_cache[key] = text
+        _llm_cache.move_to_end(key)
+        if len(_llm_cache) > LLM_CACHE_SIZE:
+            _llm_cache.popitem(last=False)
+
+
+def _cache_get(key):
+    """Cached text for a key, or None on a miss (an empty text counts as a miss)."""
+    with _llm_cache_lock:
+        text = _llm_cache.get(key)
+        if text:
+            _llm_cache.move_to_end(key)
+            return text
+
+    if _llm_disk_cache is not None:
+        text = _llm_disk_cache.get(_disk_key(key))
+        if text:
+            _memory_put(key, text)
+            return text
+    return None
+
+
+def _cache_put(key, text):
+    """Cache a generated text; empty results (blocked or no output) are not kept."""
+    if not text:
+        return
+    _memory_put(key, text)
+    if _llm_disk_cache is not None:
+        _llm_disk_cache.set(_disk_key(key), text, expire=LLM_CACHE_TTL)
+
+
+def _cached_generate(model_name, prompt):
+    """
+    Generate text for a prompt, memoized per process.
+    The prompt already encodes city/attraction/leg, so identical requests
+    (e.g. Streamlit reruns of the same stop) skip the Gemini round-trip.
+    Errors propagate; neither errors nor empty texts are cached.
+    """
+    key = (model_name, prompt)
+    text = _cache_get(key)
+    if text is None:
+        response = _get_gemini_model(model_name).generate_content(prompt)
+        text = response.text.strip()
+        _cache_put(key, text)
+    return text
+
+
+def _stream_generate(model_name, prompt):
+    """
+    Yield generated text chunk by chunk as Gemini produces it.
+    A cached prompt yields its full text at once; a completed stream is cached.
+    """
+    key = (model_name, prompt)
+    text = _cache_get(key)
+    if text is not None:
+        yield text
+        return
+
+    parts = []
+    for chunk in _get_gemini_model(model_name).generate_content(prompt, stream=True):
+        if chunk.text:
+            parts.append(chunk.text)
+            yield chunk.text
+    _cache_put(key, "".join(parts).strip())
+
 # ==========================================
 # SECTION 1: ATTRACTION DATABASE
 # ==========================================
 
+# Optional OSM tag columns copied into attraction info: column -> info key
+INFO_FIELDS = {
+    'addr:street': 'street',
+    'website': 'website',
+    'opening_hours': 'hours',
+}
+
 class AttractionDatabase:
     """
     Manages attraction information and provides context to the LLM.
@@ -23,6 +160,18 @@ class AttractionDatabase:
         self.city_name = city_name
         self.pois = pois
         self.attraction_cache = {}
+        
+        # Structure-of-arrays view of the POI columns we read, built once:
+        # lowercased name -> row of its first POI, plus one object array per column
+        self._name_index = {}
+        self._columns = {}
+        if not self.pois.empty and "name" in self.pois.columns:
+            for idx, name in enumerate(self.pois["name"].tolist()):
+                if isinstance(name, str):
+                    self._name_index.setdefault(name.lower(), idx)
+            for col in ("tourism",) + tuple(INFO_FIELDS):
+                if col in self.pois.columns:
+                    self._columns[col] = self.pois[col].to_numpy(dtype=object)
     
     def get_attraction_info(self, attraction_name):
         """
@@ -31,29 +180,22 @@ class AttractionDatabase:
         if attraction_name in self.attraction_cache:
             return self.attraction_cache[attraction_name]
         
-        if self.pois.empty or "name" not in self.pois.columns:
-            return None
-        
-        matching_pois = self.pois[self.pois["name"].str.lower() == attraction_name.lower()]
-        
-        if matching_pois.empty:
+        idx = self._name_index.get(attraction_name.lower())
+        if idx is None:
             return None
         
-        poi = matching_pois.iloc[0]
-        
+        tourism = self._columns.get("tourism")
         info = {
             'name': attraction_name,
-            'type': poi.get('tourism', 'attraction'),
+            'type': tourism[idx] if tourism is not None else 'attraction',
             'city': self.city_name,
         }
         
         # Add optional fields if available
-        if 'addr:street' in poi:
-            info['street'] = poi['addr:street']
-        if 'website' in poi:
-            info['website'] = poi['website']
-        if 'opening_hours' in poi:
-            info['hours'] = poi['opening_hours']
+        for col, key in INFO_FIELDS.items():
+            values = self._columns.get(col)
+            if values is not None:
+                info[key] = values[idx]
         
         self.attraction_cache[attraction_name] = info
         return info
@@ -75,14 +217,18 @@ class TourGuideAgent:
         self.pois = pois
         self.database = AttractionDatabase(city_name, pois)
         self.current_stop = 0
-        self.conversation_history = []
+        self.conversation_history = deque(maxlen=MAX_CONVERSATION_HISTORY)
+        self._stops = self._extract_tour_stops()
+        self._stops_lower = [stop.lower() for stop in self._stops]
+        # Lowercased leg start -> itinerary leg (first leg wins)
+        self._leg_by_start = {leg[0].lower(): leg for leg in reversed(itinerary)}
         
         # Initialize Gemini
         self.llm_available = False
+        self.model = None
         if GEMINI_API_KEY and GEMINI_API_KEY != "YOUR_API_KEY_HERE":
             try:
-                genai.configure(api_key=GEMINI_API_KEY)
-                self.model = genai.GenerativeModel(LLM_MODEL)
+                self.model = _get_gemini_model(LLM_MODEL)
                 self.llm_available = True
                 print("✓ Gemini AI initialized successfully!")
             except Exception as e:
@@ -92,6 +238,14 @@ class TourGuideAgent:
             print("⚠ No API key found. Using fallback responses...")
     
     def get_tour_stops(self):
+        """Unique stops of the tour, in visiting order (computed once at init)."""
+        return self._stops
+    
+    def get_leg_from_stop(self, stop_index):
+        """Itinerary leg that starts at the given stop, or None for the last stop."""
+        return self._leg_by_start.get(self._stops_lower[stop_index])
+    
+    def _extract_tour_stops(self):
         """Extract unique stops from itinerary."""
         stops = []
         seen = set()
@@ -125,8 +279,7 @@ The tour includes these stops:
 Be friendly, exciting, and mention 1-2 highlights they'll see. Keep it concise."""
 
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            return _cached_generate(LLM_MODEL, prompt)
         except:
             return self._fallback_welcome(stops)
     
@@ -144,9 +297,33 @@ Get ready for an unforgettable journey through history, culture, and beauty!"""
         if not self.llm_available:
             return self._fallback_description(attraction_name, info)
         
+        try:
+            return _cached_generate(LLM_MODEL, self._description_prompt(attraction_name, info))
+        except:
+            return self._fallback_description(attraction_name, info)
+    
+    def stream_description(self, attraction_name):
+        """Same as describe_attraction, but yields the text in chunks as it is generated."""
+        info = self.database.get_attraction_info(attraction_name)
+        
+        if not self.llm_available:
+            yield self._fallback_description(attraction_name, info)
+            return
+        
+        streamed = False
+        try:
+            for chunk in _stream_generate(LLM_MODEL, self._description_prompt(attraction_name, info)):
+                streamed = True
+                yield chunk
+        except:
+            if not streamed:
+                yield self._fallback_description(attraction_name, info)
+    
+    def _description_prompt(self, attraction_name, info):
+        """Prompt for a rich attraction description."""
         attraction_type = info['type'] if info else 'attraction'
         
-        prompt = f"""You are a knowledgeable tour guide in {self.city_name}.
+        return f"""You are a knowledgeable tour guide in {self.city_name}.
 
 Provide a rich, engaging description (3-4 paragraphs) of: {attraction_name}
 
@@ -160,12 +337,6 @@ Type: {attraction_type}
 City: {self.city_name}
 
 Be enthusiastic but informative. Write in second person ("you'll see..."). Keep it conversational."""
-
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
-        except:
-            return self._fallback_description(attraction_name, info)
     
     def _fallback_description(self, attraction_name, info):
         """Fallback description when LLM is unavailable."""
@@ -201,11 +372,21 @@ Provide brief, friendly walking directions (2-3 sentences). Include:
 Be conversational and helpful."""
 
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            return _cached_generate(LLM_MODEL, prompt)
         except:
             return self._fallback_directions(from_attraction, to_attraction, distance_km, walk_time_min)
     
+    def get_next_stop_guidance(self, from_attraction, to_attraction, distance_km, walk_time_min):
+        """
+        Walking directions for a leg plus the destination's description, fetched concurrently.
+        The description lands in the LLM cache, so showing the next stop needs no extra call.
+        """
+        directions = _llm_pool.submit(
+            self.get_walking_directions, from_attraction, to_attraction, distance_km, walk_time_min
+        )
+        description = _llm_pool.submit(self.describe_attraction, to_attraction)
+        return directions.result(), description.result()
+    
     def _fallback_directions(self, from_attraction, to_attraction, distance_km, walk_time_min):
         """Fallback directions when LLM is unavailable."""
         return f"""🚶 Walking from {from_attraction} to {to_attraction}
@@ -237,22 +418,11 @@ give general helpful information. Be friendly and conversational."""
     
     def _fallback_answer(self, question, current_attraction):
         """Fallback answer when LLM is unavailable."""
-        question_lower = question.lower()
+        for topic, pattern in _FALLBACK_TOPICS:
+            if pattern.search(question):
+                return _FALLBACK_RESPONSES[topic](current_attraction)
         
-        if any(word in question_lower for word in ['photo', 'picture', 'camera']):
-            return f"📸 Great question! The best photo spots at {current_attraction} are usually near the main entrance or facade. Early morning or late afternoon light works best!"
-        
-        elif any(word in question_lower for word in ['time', 'long', 'hours']):
-            return f"⏰ Most visitors spend 15-30 minutes at {current_attraction}. Take your time to fully appreciate it!"
-        
-        elif any(word in question_lower for word in ['ticket', 'price', 'cost', 'fee']):
-            return f"💰 For current ticket prices and booking information for {current_attraction}, I recommend checking their official website or asking at the entrance."
-        
-        elif any(word in question_lower for word in ['food', 'eat', 'restaurant', 'cafe']):
-            return f"🍽️ There are usually cafes and restaurants near {current_attraction}. Look for local spots just off the main tourist areas for better value!"
-        
-        else:
-            return f"That's an interesting question about {current_attraction}! For detailed information, I recommend checking with the information desk or official guides at the site."
+        return f"That's an interesting question about {current_attraction}! For detailed information, I recommend checking with the information desk or official guides at the site."
     
     def get_visitor_tips(self, attraction_name):
         """Generate practical visitor tips."""
@@ -271,8 +441,7 @@ Provide 4-5 bullet-point tips including:
 Be specific and practical. Format as bullet points."""
 
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            return _cached_generate(LLM_MODEL, prompt)
         except:
             return self._fallback_tips(attraction_name)
     
@@ -357,16 +526,15 @@ def interactive_tour_guide(city_name, itinerary, pois):
         
         # Walking directions to next stop (if not last stop)
         if stop_num < len(stops):
-            # Find the leg in itinerary
-            for leg_start, leg_end, dist, walk_time, visit_time, attr in itinerary:
-                if leg_start.lower() == stop_name.lower():
-                    print(f"\n🚶 WALKING DIRECTIONS:")
-                    print("-" * 70)
-                    directions = guide.get_walking_directions(
-                        leg_start, leg_end, dist, walk_time
-                    )
-                    print(f"{directions}\n")
-                    break
+            leg = guide.get_leg_from_stop(stop_num - 1)
+            if leg:
+                leg_start, leg_end, dist, walk_time, visit_time, attr = leg
+                print(f"\n🚶 WALKING DIRECTIONS:")
+                print("-" * 70)
+                directions = guide.get_walking_directions(
+                    leg_start, leg_end, dist, walk_time
+                )
+                print(f"{directions}\n")
     
     # Tour complete
     print("\n" + "=" * 70)
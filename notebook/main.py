@@ -11,7 +11,6 @@ from path_planning import (
     nearest_node,
     format_minutes,
 )
-from llm_tour_guide import interactive_tour_guide
 from config import AVAILABLE_CITIES, GEMINI_API_KEY
 
 def main():
@@ -98,8 +97,9 @@ def main():
         print("❌ Starting point is required.")
         return
     
-    # Verify starting point exists
-    if nearest_node(G, pois, start_name) is None:
+    # Verify starting point exists (resolved once, reused for planning)
+    start_node = nearest_node(G, pois, start_name)
+    if start_node is None:
         print("❌ Starting point not found. Please choose from the list above.")
         return
 
@@ -110,8 +110,9 @@ def main():
         print("❌ Destination is required.")
         return
     
-    # Verify destination exists
-    if nearest_node(G, pois, end_name) is None:
+    # Verify destination exists (resolved once, reused for planning)
+    end_node = nearest_node(G, pois, end_name)
+    if end_node is None:
         print("❌ Destination not found. Please choose from the list above.")
         return
     
@@ -145,7 +146,8 @@ def main():
     print("=" * 70)
     
     path, total_dist, total_time, itinerary, direct_comparison, stop_nodes = plan_time_based_tour(
-        G, pois, start_name, end_name, time_minutes
+        G, pois, start_name, end_name, time_minutes,
+        start_node=start_node, end_node=end_node,
     )
 
     if path is None or not itinerary:
@@ -260,6 +262,7 @@ def main():
     
     if use_guide in ['yes', 'y', 'yeah', 'sure', 'ok']:
         print("\n🎉 Starting AI tour guide experience...\n")
+        from llm_tour_guide import interactive_tour_guide
         interactive_tour_guide(city_name, itinerary, pois)
     else:
         print("\n✅ Tour planning complete!")
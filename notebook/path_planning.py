@@ -5,35 +5,77 @@
 # Using OSMNX + Weighted A* Search + Greedy Selection
 # ==========================================
 
-import osmnx as ox
 import networkx as nx
 import heapq
-import folium
-import matplotlib.pyplot as plt
-from shapely.geometry import Point
+import numpy as np
 import math
-import pickle
 import os
+import hashlib
+import shapely
+import threading
+from collections import OrderedDict
+from itertools import pairwise
+from concurrent.futures import ThreadPoolExecutor
 
 # Import shared configuration
 from config import *
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+from city_cache import (
+    city_cache_path, migrate_legacy_city, save_city, load_city, load_city_graph, load_city_pois,
+    fetch_pois_tiled, ensure_graph_arrays, ensure_adjacency, poi_table,
+)
 
 print("✓ Path planning module loaded successfully.")
-print(f"OSMnx version: {ox.__version__}")
 
 try:
-    import sklearn
-    print(f"✓ scikit-learn is ready! Version: {sklearn.__version__}")
-    SKLEARN_AVAILABLE = True
+    from numba import njit, vectorize
+    NUMBA_AVAILABLE = True
 except ImportError:
-    print("⚠ Warning: scikit-learn not found. Using fallback method for nearest node search.")
-    SKLEARN_AVAILABLE = False
+    print("⚠ Warning: numba not found. Distance helpers will run as plain Python.")
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit so decorated functions stay plain Python."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
 
 
 # ==========================================
 # SECTION 1: DATA LOADING (WITH CACHING)
 # ==========================================
 
+def _import_osmnx():
+    """
+    Import OSMnx on first download (it takes seconds to import) and point it
+    at the on-disk HTTP cache so repeat downloads are served locally.
+    """
+    import osmnx as ox
+    ox.settings.use_cache = True
+    ox.settings.cache_folder = OSM_HTTP_CACHE_DIR
+    ox.settings.requests_timeout = OSM_REQUEST_TIMEOUT
+    return ox
+
+
+def _cached_city_path(city_name):
+    """
+    Path of a city's cache bundle, or None if the city is not cached.
+    Pickles left by older releases are converted to a bundle on first use.
+    """
+    city_cache = city_cache_path(CACHE_DIR, city_name)
+    if os.path.exists(city_cache):
+        return city_cache
+    try:
+        migrated = migrate_legacy_city(CACHE_DIR, city_name)
+    except Exception as e:
+        print(f"⚠ Could not convert the old {city_name} cache ({e}). Rerun cache_builder.py to rebuild it.")
+        return None
+    if migrated is not None:
+        print(f"📦 Converted the old {city_name} cache files to {migrated}")
+    return migrated
+
+
 def load_city_data(city_name):
     """
     Load street network and tourist attractions with caching support.
@@ -42,18 +84,13 @@ def load_city_data(city_name):
     
     # Setup cache paths
     os.makedirs(CACHE_DIR, exist_ok=True)
-    safe_name = city_name.replace(", ", "_").replace(" ", "_")
-    graph_cache = os.path.join(CACHE_DIR, f"{safe_name}_graph.pkl")
-    pois_cache = os.path.join(CACHE_DIR, f"{safe_name}_pois.pkl")
+    city_cache = _cached_city_path(city_name)
     
     # Try loading from cache first
-    if os.path.exists(graph_cache) and os.path.exists(pois_cache):
+    if city_cache is not None:
         print(f"\n📦 Loading {city_name} from cache...")
         try:
-            with open(graph_cache, 'rb') as f:
-                G = pickle.load(f)
-            with open(pois_cache, 'rb') as f:
-                pois = pickle.load(f)
+            G, pois = load_city(city_cache)
             
             print(f"✓ Loaded from cache in ~2 seconds! ⚡")
             print(f"✓ Graph: {len(G.nodes)} nodes, {len(G.edges)} edges")
@@ -69,27 +106,24 @@ def load_city_data(city_name):
     print("⏳ This will take 30-60 seconds, but will be cached for next time...")
 
     try:
+        ox = _import_osmnx()
+        print(f"OSMnx version: {ox.__version__}")
+
         # Load the street network for walking routes
         G = ox.graph_from_place(city_name, network_type="walk", simplify=True)
         G = nx.Graph(G)
 
         # Fetch tourist attractions (filtered for performance)
         tags = {"tourism": ["museum", "attraction", "viewpoint", "gallery", "artwork"]}
-        pois = ox.features_from_place(city_name, tags=tags)
+        # Tiled download, already slimmed to named attractions and the columns we use
+        pois = fetch_pois_tiled(city_name, tags)
 
         if pois.empty:
             print("⚠ No attractions found for this city.")
-        else:
-            # Clean POI data - keep only named attractions
-            if "name" in pois.columns:
-                pois = pois[pois["name"].notna()].copy()
 
         # Save to cache for next time
         print(f"💾 Saving to cache...")
-        with open(graph_cache, 'wb') as f:
-            pickle.dump(G, f)
-        with open(pois_cache, 'wb') as f:
-            pickle.dump(pois, f)
+        save_city(city_cache_path(CACHE_DIR, city_name), G, pois)
 
         print(f"✓ City graph loaded: {len(G.nodes)} nodes, {len(G.edges)} edges")
         print(f"✓ Found {len(pois)} POIs (cached for next time)")
@@ -101,38 +135,89 @@ def load_city_data(city_name):
         return None, None
 
 
+def load_city_graph_data(city_name):
+    """
+    Load only the street network for a city.
+    Decodes just the graph section of the cache bundle; falls back to load_city_data.
+    """
+    city_cache = _cached_city_path(city_name)
+    if city_cache is not None:
+        try:
+            return load_city_graph(city_cache)
+        except Exception as e:
+            print(f"⚠ Cache load failed ({e}). Downloading fresh data...")
+    G, _ = load_city_data(city_name)
+    return G
+
+
+def load_city_pois_data(city_name):
+    """
+    Load only the tourist attractions for a city.
+    Decodes just the POI section of the cache bundle; falls back to load_city_data.
+    """
+    city_cache = _cached_city_path(city_name)
+    if city_cache is not None:
+        try:
+            return load_city_pois(city_cache)
+        except Exception as e:
+            print(f"⚠ Cache load failed ({e}). Downloading fresh data...")
+    _, pois = load_city_data(city_name)
+    return pois
+
+
 # ==========================================
 # SECTION 2: HELPER FUNCTIONS
 # ==========================================
 
-def haversine(coord1, coord2):
-    """Calculate distance (in km) between two coordinates (lat, lon)."""
-    lon1, lat1, lon2, lat2 = map(math.radians, [coord1[1], coord1[0], coord2[1], coord2[0]])
+EARTH_RADIUS_KM = 6371.0
+
+@njit(cache=True, fastmath=True)
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance (in km) between two points given as scalar lat/lon degrees."""
+    lat1 = math.radians(lat1)
+    lon1 = math.radians(lon1)
+    lat2 = math.radians(lat2)
+    lon2 = math.radians(lon2)
     dlon = lon2 - lon1
     dlat = lat2 - lat1
     a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
     c = 2 * math.asin(math.sqrt(a))
-    return 6371 * c  # Earth radius in km
+    return EARTH_RADIUS_KM * c
+
+
+def haversine(coord1, coord2):
+    """Calculate distance (in km) between two coordinates (lat, lon)."""
+    return haversine_km(coord1[0], coord1[1], coord2[0], coord2[1])
+
+
+if NUMBA_AVAILABLE:
+    @vectorize(["float64(float64, float64, float64, float64)"], cache=True, fastmath=True)
+    def _haversine_ufunc(lat1, lon1, lat2, lon2):
+        """haversine_km compiled into a NumPy ufunc: one fused loop, no temporaries."""
+        return haversine_km(lat1, lon1, lat2, lon2)
+
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    """Vectorized haversine distance (km); arguments may be arrays or scalars in degrees."""
+    if NUMBA_AVAILABLE:
+        return _haversine_ufunc(lat1, lon1, lat2, lon2)
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
 
 
 def nearest_node_fallback(G, lon, lat):
     """
-    Fallback method to find nearest node without scikit-learn.
-    Uses simple distance calculation to all nodes.
+    Fallback method to find nearest node without the KD-tree.
+    One vectorized haversine pass over all nodes; the arcsin/sqrt step is
+    skipped because it does not change which node is closest.
     """
-    min_dist = float('inf')
-    nearest = None
-    
-    for node, data in G.nodes(data=True):
-        node_lat = data['y']
-        node_lon = data['x']
-        dist = haversine((lat, lon), (node_lat, node_lon))
-        
-        if dist < min_dist:
-            min_dist = dist
-            nearest = node
-    
-    return nearest
+    arrays = ensure_graph_arrays(G)
+    lat_r = math.radians(lat)
+    lon_r = math.radians(lon)
+    a = (np.sin((arrays["lat_rad"] - lat_r) / 2) ** 2
+         + math.cos(lat_r) * arrays["cos_lat"] * np.sin((arrays["lon_rad"] - lon_r) / 2) ** 2)
+    return int(arrays["node_ids"][np.argmin(a)])
 
 
 def nearest_node(G, pois, name):
@@ -141,83 +226,117 @@ def nearest_node(G, pois, name):
         print("⚠ No named POIs available.")
         return None
 
-    matching_pois = pois[pois["name"].str.lower() == name.lower()]
+    coords = get_poi_coords(pois, name)
 
-    if matching_pois.empty:
+    if coords is None:
         print(f"⚠ Attraction '{name}' not found. Please choose from available list.")
         return None
 
-    poi = matching_pois.iloc[0]
+    lat, lon = coords
+    try:
+        return nearest_node_vectorized(G, lon, lat)
+    except Exception:
+        return nearest_node_fallback(G, lon, lat)
 
-    # Handle different geometry types
-    if hasattr(poi.geometry, "centroid"):
-        point = poi.geometry.centroid
-    else:
-        point = poi.geometry
 
-    # Use scikit-learn method if available, otherwise use fallback
-    if SKLEARN_AVAILABLE:
-        try:
-            return ox.distance.nearest_nodes(G, point.x, point.y)
-        except:
-            return nearest_node_fallback(G, point.x, point.y)
-    else:
-        return nearest_node_fallback(G, point.x, point.y)
+def nearest_node_vectorized(G, lon, lat):
+    """Nearest graph node to a single (lon, lat) point."""
+    return int(nearest_nodes(G, np.array([lon]), np.array([lat]))[0])
+
+
+def nearest_nodes(G, lons, lats):
+    """
+    Nearest graph node for each of many points, in one KD-tree query.
+    Nodes and points live on the unit sphere, so the nearest point by chord
+    is the nearest by great-circle distance. The tree is built once per graph.
+    """
+    arrays = ensure_graph_arrays(G)
+    if "node_tree" not in arrays:
+        arrays["node_tree"] = cKDTree(_unit_vectors(arrays["lat"], arrays["lon"]))
+    _, rows = arrays["node_tree"].query(_unit_vectors(lats, lons))
+    return arrays["node_ids"][rows]
+
+
+def build_poi_node_index(G, pois):
+    """{lowercased name: nearest graph node} for every named POI, resolved in one batch."""
+    if pois.empty or "name" not in pois.columns:
+        return {}
+    table = poi_table(pois)
+    rows = np.fromiter(table.name_index.values(), dtype=np.int64, count=len(table.name_index))
+    nodes = nearest_nodes(G, table.lon[rows], table.lat[rows])
+    return dict(zip(table.name_index, nodes.tolist()))
 
 
 def get_node_coords(G, node):
     """Get coordinates of a graph node."""
-    return (G.nodes[node]["y"], G.nodes[node]["x"])  # (lat, lon)
+    arrays = ensure_graph_arrays(G)
+    i = arrays["node_index"][node]
+    return (float(arrays["lat"][i]), float(arrays["lon"][i]))  # (lat, lon)
+
+
+def get_nodes_lonlat(G, nodes):
+    """Get coordinates of many graph nodes as an (n, 2) array of (lon, lat)."""
+    arrays = ensure_graph_arrays(G)
+    node_index = arrays["node_index"]
+    rows = np.fromiter((node_index[n] for n in nodes), dtype=np.int64, count=len(nodes))
+    return arrays["lonlat"][rows]
 
 
 def get_poi_coords(pois, name):
-    """Get coordinates of a POI by name."""
+    """Get centroid coordinates of a POI by name (case-insensitive)."""
     if pois.empty or "name" not in pois.columns:
         return None
     
-    matching_pois = pois[pois["name"].str.lower() == name.lower()]
-    if matching_pois.empty:
+    table = poi_table(pois)
+    i = table.name_index.get(name.lower())
+    if i is None:
         return None
     
-    poi = matching_pois.iloc[0]
-    if hasattr(poi.geometry, "centroid"):
-        point = poi.geometry.centroid
-    else:
-        point = poi.geometry
-    
-    return (point.y, point.x)  # (lat, lon)
+    return (float(table.lat[i]), float(table.lon[i]))  # (lat, lon)
 
 
-def compute_attraction_score(G, node, pois, radius_km=0.4):
-    """Assign attraction score based on proximity to attractions."""
-    if pois.empty:
-        return 0
+def _unit_vectors(lat_deg, lon_deg):
+    """Map lat/lon (degrees) onto 3-D points on the unit sphere."""
+    lat = np.radians(lat_deg)
+    lon = np.radians(lon_deg)
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
 
-    node_lat = G.nodes[node]["y"]
-    node_lon = G.nodes[node]["x"]
-    node_point = Point(node_lon, node_lat)
 
-    nearby_count = 0
-    for _, poi in pois.iterrows():
-        if hasattr(poi.geometry, "centroid"):
-            poi_point = poi.geometry.centroid
-        else:
-            poi_point = poi.geometry
+def build_poi_index(pois):
+    """
+    Build a KD-tree over POI centroids for fast radius counts.
+    Points live on the unit sphere, so a straight-line (chord) radius query
+    is exactly a great-circle radius query. Returns None if there are no POIs.
+    """
+    if pois.empty:
+        return None
+    table = poi_table(pois)
+    return cKDTree(_unit_vectors(table.lat, table.lon))
 
-        distance_deg = node_point.distance(poi_point)
-        distance_km = distance_deg * 111  # approx conversion
 
-        if distance_km < radius_km:
-            nearby_count += 1
+def build_node_attraction_scores(G, poi_index, radius_km=0.4):
+    """
+    Attraction score of every graph node in one batched KD-tree query.
+    Returns an int64 array aligned with G.graph['node_ids'].
+    """
+    arrays = ensure_graph_arrays(G)
+    if poi_index is None:
+        return np.zeros(len(arrays["node_ids"]), dtype=np.int64)
 
-    return nearby_count
+    chord = 2.0 * math.sin(radius_km / (2.0 * EARTH_RADIUS_KM))
+    points = _unit_vectors(arrays["lat"], arrays["lon"])
+    return np.asarray(poi_index.query_ball_point(points, chord, return_length=True), dtype=np.int64)
 
 
 def estimate_time_minutes(distance_km, speed_kmh=WALKING_SPEED_KMH):
-    """Estimate time in minutes given distance in km and speed in km/h."""
+    """
+    Estimate time in minutes given distance in km and speed in km/h.
+    A single multiply, so distance_km may also be a NumPy array.
+    """
     if speed_kmh <= 0:
         return None
-    return (distance_km / speed_kmh) * 60
+    return distance_km * (60.0 / speed_kmh)
 
 
 def format_minutes(minutes):
@@ -233,6 +352,133 @@ def format_minutes(minutes):
 # SECTION 3: SCENIC A* ALGORITHM
 # ==========================================
 
+@njit(cache=True)
+def _heap_less(cost, ranks, a, b):
+    """Heap order on node rows: lower cost first, ties broken by node id."""
+    return cost[a] < cost[b] or (cost[a] == cost[b] and ranks[a] < ranks[b])
+
+
+@njit(cache=True)
+def _heap_sift_up(heap, pos, cost, ranks, i):
+    node = heap[i]
+    while i > 0:
+        parent = (i - 1) >> 1
+        if not _heap_less(cost, ranks, node, heap[parent]):
+            break
+        heap[i] = heap[parent]
+        pos[heap[i]] = i
+        i = parent
+    heap[i] = node
+    pos[node] = i
+
+
+@njit(cache=True)
+def _heap_sift_down(heap, pos, cost, ranks, size, i):
+    node = heap[i]
+    while True:
+        child = 2 * i + 1
+        if child >= size:
+            break
+        if child + 1 < size and _heap_less(cost, ranks, heap[child + 1], heap[child]):
+            child += 1
+        if not _heap_less(cost, ranks, heap[child], node):
+            break
+        heap[i] = heap[child]
+        pos[heap[i]] = i
+        i = child
+    heap[i] = node
+    pos[node] = i
+
+
+@njit(cache=True, nogil=True)
+def _scenic_a_star_kernel(start, goal, indptr, indices, weights, node_ids, h_to_goal, node_attr,
+                          attraction_weight, heuristic_weight, max_distance_km, max_iterations):
+    """
+    Scenic A* over CSR arrays (rows, not node ids). Releases the GIL, so
+    independent legs can be searched on parallel threads.
+    The open set is an indexed binary heap of node rows keyed by best_cost:
+    a cheaper route updates the node's entry in place (decrease-key), so the
+    heap never holds stale entries and is never larger than the graph.
+    Returns (path rows, distance, attraction); empty path if no route.
+    """
+    n_nodes = len(indptr) - 1
+    heap = np.empty(n_nodes, dtype=np.int64)
+    pos = np.full(n_nodes, -1, dtype=np.int64)  # heap position of each row, -1 if not queued
+    best_cost = np.full(n_nodes, np.inf)
+    dist = np.zeros(n_nodes, dtype=np.float64)
+    attr = np.zeros(n_nodes, dtype=np.int64)
+    visited = np.zeros(n_nodes, dtype=np.bool_)
+    came_from = np.full(n_nodes, -1, dtype=np.int64)
+
+    best_cost[start] = 0.0
+    heap[0] = start
+    pos[start] = 0
+    size = 1
+
+    iterations = 0
+    while size > 0 and iterations < max_iterations:
+        iterations += 1
+
+        node = heap[0]
+        pos[node] = -1
+        size -= 1
+        if size > 0:
+            heap[0] = heap[size]
+            _heap_sift_down(heap, pos, best_cost, node_ids, size, 0)
+        visited[node] = True
+
+        total_dist = dist[node]
+        total_attr = attr[node]
+
+        # Found goal: walk the parent pointers back to the start
+        if node == goal:
+            length = 1
+            row = node
+            while row != start:
+                row = came_from[row]
+                length += 1
+            path = np.empty(length, dtype=np.int64)
+            row = node
+            for k in range(length - 1, -1, -1):
+                path[k] = row
+                row = came_from[row]
+            return path, total_dist, total_attr
+
+        # Hard cutoff for overlong legs
+        if total_dist > max_distance_km:
+            continue
+
+        for k in range(indptr[node], indptr[node + 1]):
+            neighbor = indices[k]
+            if visited[neighbor]:
+                continue
+
+            # The straight line to the goal is a lower bound on the rest of the walk
+            new_dist = total_dist + weights[k]
+            if new_dist + h_to_goal[neighbor] > max_distance_km:
+                continue
+
+            new_attr = total_attr + node_attr[neighbor]
+            new_cost = new_dist - attraction_weight * new_attr + heuristic_weight * h_to_goal[neighbor]
+
+            # Only keep the route if it improves on the best known one to the neighbor
+            if new_cost >= best_cost[neighbor]:
+                continue
+            best_cost[neighbor] = new_cost
+            came_from[neighbor] = node
+            dist[neighbor] = new_dist
+            attr[neighbor] = new_attr
+
+            if pos[neighbor] < 0:
+                heap[size] = neighbor
+                size += 1
+                _heap_sift_up(heap, pos, best_cost, node_ids, size - 1)
+            else:
+                _heap_sift_up(heap, pos, best_cost, node_ids, pos[neighbor])
+
+    return np.empty(0, dtype=np.int64), 0.0, 0
+
+
 def scenic_a_star(
     G,
     start,
@@ -241,102 +487,254 @@ def scenic_a_star(
     attraction_weight=ATTRACTION_WEIGHT,
     max_iterations=30000,
     max_distance_km=MAX_WALK_LEG_KM,
+    poi_index=None,
+    node_attr=None,
 ):
     """
     Modified A* algorithm balancing distance and attraction.
     Higher attraction_weight = more scenic routes.
+    Pass a prebuilt poi_index (see build_poi_index) or node_attr
+    (see build_node_attraction_scores) to share them across legs.
+    Runs as a compiled kernel when numba is installed.
     """
-    pq = []
-    heapq.heappush(pq, (0, start, [start], 0.0, 0))
-    visited = set()
+    arrays = ensure_graph_arrays(G)
+    if node_attr is None:
+        if poi_index is None:
+            poi_index = build_poi_index(pois)
+        node_attr = build_node_attraction_scores(G, poi_index, radius_km=0.4)
+
+    # Straight-line distance to the goal for every node, computed in one pass
+    node_index = arrays["node_index"]
+    goal_lat, goal_lon = get_node_coords(G, goal)
+    h_to_goal = haversine_np(arrays["lat"], arrays["lon"], goal_lat, goal_lon)
+
+    if NUMBA_AVAILABLE:
+        csr = arrays["csr"]
+        rows, total_dist, total_attr = _scenic_a_star_kernel(
+            node_index[start], node_index[goal],
+            csr.indptr, csr.indices, csr.data, arrays["node_ids"],
+            h_to_goal, node_attr,
+            float(attraction_weight), float(HEURISTIC_WEIGHT),
+            float(max_distance_km), int(max_iterations),
+        )
+    else:
+        rows, total_dist, total_attr = _scenic_a_star_python(
+            node_index[start], node_index[goal],
+            ensure_adjacency(G), arrays["node_ids"].tolist(),
+            h_to_goal.tolist(), node_attr.tolist(),
+            attraction_weight, HEURISTIC_WEIGHT, max_distance_km, max_iterations,
+        )
+
+    if len(rows) == 0:
+        return None, None, None
+    return arrays["node_ids"][rows].tolist(), float(total_dist), int(total_attr)
 
-    goal_lat = G.nodes[goal]["y"]
-    goal_lon = G.nodes[goal]["x"]
+
+def _scenic_a_star_python(start, goal, adjacency, node_ids, h_to_goal, node_attr,
+                          attraction_weight, heuristic_weight, max_distance_km, max_iterations):
+    """
+    Pure-Python version of _scenic_a_star_kernel (used without numba).
+    Works on node rows with the per-row (neighbor, km) tuples from
+    ensure_adjacency, so the inner loop does no dict lookups.
+    """
+    n_nodes = len(adjacency)
+    visited = [False] * n_nodes
+
+    # Parent pointers and best known cost per row; the path is rebuilt once at the goal
+    came_from = [-1] * n_nodes
+    best_cost = [math.inf] * n_nodes
+    best_cost[start] = 0.0
+
+    # Heap entries: (cost, node id for tie-breaking, row, distance, attraction)
+    pq = [(0.0, node_ids[start], start, 0.0, 0)]
 
     iterations = 0
 
     while pq and iterations < max_iterations:
-        iterations += 1
-
-        cost, node, path, total_dist, total_attr = heapq.heappop(pq)
+        cost, _, node, total_dist, total_attr = heapq.heappop(pq)
 
-        if node in visited:
+        # Lazy deletion: skip entries superseded by a cheaper route
+        if cost > best_cost[node]:
             continue
-        visited.add(node)
+
+        iterations += 1
+        visited[node] = True
 
         # Found goal
         if node == goal:
+            path = [goal]
+            while path[-1] != start:
+                path.append(came_from[path[-1]])
+            path.reverse()
             return path, total_dist, total_attr
 
         # Hard cutoff for overlong legs
         if total_dist > max_distance_km:
             continue
 
-        for neighbor in G.neighbors(node):
-            if neighbor in visited:
+        for neighbor, distance in adjacency[node]:
+            if visited[neighbor]:
                 continue
 
-            edge_data = G[node][neighbor]
+            new_dist = total_dist + distance
 
-            if isinstance(edge_data, dict):
-                distance = edge_data.get("length", 100) / 1000.0  # m → km
-            else:
-                node_lat = G.nodes[node]["y"]
-                node_lon = G.nodes[node]["x"]
-                neighbor_lat = G.nodes[neighbor]["y"]
-                neighbor_lon = G.nodes[neighbor]["x"]
-                distance = haversine((node_lat, node_lon), (neighbor_lat, neighbor_lon))
+            # Skip if too long, even along a straight line to the goal
+            if new_dist + h_to_goal[neighbor] > max_distance_km:
+                continue
 
-            new_dist = total_dist + distance
+            # Attraction score of every node is precomputed
+            new_attr = total_attr + node_attr[neighbor]
 
-            # Skip if too long
-            if new_dist > max_distance_km:
+            # Heuristic: straight-line distance to goal
+            new_cost = new_dist - (attraction_weight * new_attr) + heuristic_weight * h_to_goal[neighbor]
+
+            # Only keep the route if it improves on the best known one to the neighbor
+            if new_cost >= best_cost[neighbor]:
                 continue
+            best_cost[neighbor] = new_cost
+            came_from[neighbor] = node
 
-            # Attraction scoring (periodic for performance)
-            if iterations % 10 == 0:
-                attraction = compute_attraction_score(G, neighbor, pois, radius_km=0.4)
-            else:
-                attraction = 0
+            heapq.heappush(pq, (new_cost, node_ids[neighbor], neighbor, new_dist, new_attr))
 
-            new_attr = total_attr + attraction
+    return [], 0.0, 0
+
+
+# Scenic legs remembered across plans (e.g. when only the time budget changes),
+# per graph on G.graph so a dropped city takes its legs with it
+SCENIC_LEG_CACHE_SIZE = 4096
+_scenic_leg_cache_lock = threading.Lock()
+
+# Threads used to route a tour's legs side by side (only with numba, whose kernel releases the GIL),
+# shared by every plan so concurrent sessions don't each start a pool
+SCENIC_LEG_WORKERS = min(4, os.cpu_count() or 1)
+_leg_pool = ThreadPoolExecutor(max_workers=SCENIC_LEG_WORKERS)
 
-            # Heuristic: straight-line distance to goal
-            neighbor_lat = G.nodes[neighbor]["y"]
-            neighbor_lon = G.nodes[neighbor]["x"]
-            h = haversine((neighbor_lat, neighbor_lon), (goal_lat, goal_lon))
 
-            new_cost = new_dist - (attraction_weight * new_attr) + HEURISTIC_WEIGHT * h
+class _NodeScores:
+    """Per-node attraction scores, hashable by content so they can key the leg cache."""
 
-            heapq.heappush(pq, (new_cost, neighbor, path + [neighbor], new_dist, new_attr))
+    __slots__ = ("values", "digest")
 
-    return None, None, None
+    def __init__(self, values):
+        self.values = values
+        self.digest = hashlib.blake2b(values.tobytes(), digest_size=16).digest()
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __eq__(self, other):
+        return isinstance(other, _NodeScores) and self.digest == other.digest
+
+
+def _cached_scenic_leg(G, start, goal, node_scores, attraction_weight, max_iterations, max_distance_km):
+    """
+    scenic_a_star memoized per endpoints, scores and search limits, in a
+    least-recently-used cache kept on G.graph.
+    """
+    cache = ensure_graph_arrays(G).setdefault("scenic_leg_cache", OrderedDict())
+    key = (start, goal, node_scores, attraction_weight, max_iterations, max_distance_km)
+    with _scenic_leg_cache_lock:
+        leg = cache.get(key)
+        if leg is not None:
+            cache.move_to_end(key)
+            return leg
+
+    path, dist, attr = scenic_a_star(
+        G, start, goal, None,
+        attraction_weight=attraction_weight,
+        max_iterations=max_iterations,
+        max_distance_km=max_distance_km,
+        node_attr=node_scores.values,
+    )
+    leg = (tuple(path) if path is not None else None), dist, attr
+
+    with _scenic_leg_cache_lock:
+        cache[key] = leg
+        cache.move_to_end(key)
+        if len(cache) > SCENIC_LEG_CACHE_SIZE:
+            cache.popitem(last=False)
+    return leg
+
+
+def _route_tour_leg(G, leg_start_node, leg_end_node, node_attr, max_expansions, max_leg_km):
+    """
+    Scenic route of one tour leg as (path, km, attraction, straight-line km).
+    The path is None when the leg could not be routed.
+    """
+    if leg_start_node is None or leg_end_node is None:
+        return None, None, None, None
+    
+    # No walk is shorter than the straight line, so overlong legs skip the search
+    straight = haversine(get_node_coords(G, leg_start_node), get_node_coords(G, leg_end_node))
+    if straight > max_leg_km:
+        return None, None, None, straight
+    
+    # Repeat legs are served from the leg cache
+    leg_path, leg_dist, leg_attr = _cached_scenic_leg(
+        G,
+        leg_start_node,
+        leg_end_node,
+        node_attr,
+        ATTRACTION_WEIGHT,
+        max_expansions,
+        max_leg_km,
+    )
+    return leg_path, leg_dist, leg_attr, straight
+
+
+def _routed_tour_minutes(leg_routes):
+    """Walking plus visit minutes of routed legs, as plan_time_based_tour totals them."""
+    total = 0.0
+    for i, (leg_path, leg_dist, _, straight) in enumerate(leg_routes):
+        if straight is None:
+            continue  # Leg skipped, a stop has no graph node
+        total += estimate_time_minutes(straight if leg_path is None else leg_dist)
+        if i < len(leg_routes) - 1:
+            total += VISIT_TIME_PER_ATTRACTION_MIN
+    return total
 
 
 def direct_route(G, start, goal):
     """
-    Calculate direct route using standard A* (no scenic weighting).
-    Used as baseline comparison.
+    Calculate shortest route (no scenic weighting). Used as baseline comparison.
+    Runs the A* kernel with no attraction term and an unweighted heuristic,
+    or SciPy's Dijkstra on the CSR adjacency matrix when numba is missing.
     """
     try:
-        path = nx.astar_path(G, start, goal, heuristic=lambda u, v: haversine(
-            (G.nodes[u]["y"], G.nodes[u]["x"]),
-            (G.nodes[v]["y"], G.nodes[v]["x"])
-        ), weight='length')
-        
-        # Calculate distance
-        total_dist = 0.0
-        for i in range(len(path) - 1):
-            edge_data = G[path[i]][path[i+1]]
-            if isinstance(edge_data, dict):
-                total_dist += edge_data.get("length", 100) / 1000.0
-            else:
-                coord1 = get_node_coords(G, path[i])
-                coord2 = get_node_coords(G, path[i+1])
-                total_dist += haversine(coord1, coord2)
-        
-        return path, total_dist
-    except:
+        arrays = ensure_graph_arrays(G)
+        node_index = arrays["node_index"]
+        node_ids = arrays["node_ids"]
+        source = node_index[start]
+        target = node_index[goal]
+
+        if NUMBA_AVAILABLE:
+            csr = arrays["csr"]
+            goal_lat, goal_lon = get_node_coords(G, goal)
+            h_to_goal = haversine_np(arrays["lat"], arrays["lon"], goal_lat, goal_lon)
+            rows, dist, _ = _scenic_a_star_kernel(
+                source, target,
+                csr.indptr, csr.indices, csr.data, node_ids,
+                h_to_goal, np.zeros(len(node_ids), dtype=np.int64),
+                0.0, 1.0, np.inf, len(csr.indices) + 1,
+            )
+            if len(rows) == 0:
+                return None, None
+            return node_ids[rows].tolist(), float(dist)
+
+        dist, predecessors = dijkstra(
+            arrays["csr"], directed=False, indices=source, return_predecessors=True
+        )
+        if np.isinf(dist[target]):
+            return None, None
+
+        # Walk predecessors back from the goal
+        rows = [target]
+        while rows[-1] != source:
+            rows.append(predecessors[rows[-1]])
+
+        path = [int(node_ids[i]) for i in reversed(rows)]
+        return path, float(dist[target])
+    except Exception:
         return None, None
 
 
@@ -344,71 +742,113 @@ def direct_route(G, start, goal):
 # SECTION 4: TIME-BASED TOUR PLANNING
 # ==========================================
 
-def score_attraction(G, pois, poi_name, start_node, end_node):
+@njit(cache=True, fastmath=True)
+def _corridor_scores_kernel(detour):
+    out = np.empty(detour.shape[0], dtype=np.float64)
+    for i in range(detour.shape[0]):
+        d = detour[i]
+        if d < 0.5:
+            out[i] = 3.0
+        elif d < 1.0:
+            out[i] = 2.0
+        elif d < 2.0:
+            out[i] = 1.0
+        else:
+            out[i] = 0.3
+    return out
+
+
+def corridor_scores(detour):
+    """
+    Corridor score for detours (km) over the direct route:
+    < 0.5 very close (3.0), < 1.0 reasonable (2.0), < 2.0 moderate (1.0), else 0.3.
+    """
+    if NUMBA_AVAILABLE:
+        return _corridor_scores_kernel(np.ascontiguousarray(detour, dtype=np.float64))
+    return np.select([detour < 0.5, detour < 1.0, detour < 2.0], [3.0, 2.0, 1.0], 0.3)
+
+
+def score_attractions(G, pois, poi_names, start_node, end_node, poi_index=None, node_cache=None):
     """
-    Score an attraction based on:
+    Score attractions based on:
     - Proximity to attractions (density)
     - Position along start-to-end corridor
     - Tourism type (museums > artwork)
+    All attractions are scored together, with one vectorized haversine pass
+    per endpoint. Returns a float64 array aligned with poi_names; attractions
+    that cannot be placed on the graph score 0.
     """
-    poi_node = nearest_node(G, pois, poi_name)
-    if poi_node is None:
-        return 0
+    if poi_index is None:
+        poi_index = build_poi_index(pois)
+    if node_cache is None:
+        node_cache = build_poi_node_index(G, pois)
     
-    # Base score: attraction density
-    density_score = compute_attraction_score(G, poi_node, pois, radius_km=0.5)
+    arrays = ensure_graph_arrays(G)
+    node_index = arrays["node_index"]
+    scores = np.zeros(len(poi_names), dtype=np.float64)
     
-    # Corridor score: prefer attractions between start and end
+    nodes = [node_cache.get(name.lower()) for name in poi_names]
+    found = np.array([node is not None for node in nodes], dtype=bool)
+    found_nodes = [node for node in nodes if node is not None]
+    if not found_nodes:
+        return scores
+    rows = np.array([node_index[node] for node in found_nodes], dtype=np.int64)
+    
+    lat = arrays["lat"][rows]
+    lon = arrays["lon"][rows]
+    
+    # Base score: attraction density, one KD-tree radius query for all nodes
+    if poi_index is not None:
+        chord = 2.0 * math.sin(0.5 / (2.0 * EARTH_RADIUS_KM))
+        density_score = poi_index.query_ball_point(
+            _unit_vectors(lat, lon), chord, return_length=True
+        ).astype(np.float64)
+    else:
+        density_score = np.zeros(len(rows), dtype=np.float64)
+    
+    # Corridor score from the detour over the direct start-to-end distance
     start_coords = get_node_coords(G, start_node)
     end_coords = get_node_coords(G, end_node)
-    poi_coords = get_node_coords(G, poi_node)
-    
-    # Distance from start and end
-    dist_from_start = haversine(start_coords, poi_coords)
-    dist_from_end = haversine(poi_coords, end_coords)
+    dist_from_start = haversine_np(start_coords[0], start_coords[1], lat, lon)
+    dist_from_end = haversine_np(lat, lon, end_coords[0], end_coords[1])
     direct_dist = haversine(start_coords, end_coords)
-    
-    # Check if attraction is roughly along the path (not a huge detour)
-    # If dist_from_start + dist_from_end ≈ direct_dist, it's on the path
     detour = (dist_from_start + dist_from_end) - direct_dist
+    corridor_score = corridor_scores(detour)
     
-    if detour < 0.5:  # Very close to direct path
-        corridor_score = 3.0
-    elif detour < 1.0:  # Reasonable detour
-        corridor_score = 2.0
-    elif detour < 2.0:  # Moderate detour
-        corridor_score = 1.0
-    else:  # Too far off path
-        corridor_score = 0.3
-    
-    # Type bonus
-    matching_pois = pois[pois["name"].str.lower() == poi_name.lower()]
-    if not matching_pois.empty:
-        poi_data = matching_pois.iloc[0]
-        tourism_type = poi_data.get("tourism", "")
-        
-        type_bonus = 1.0
-        if tourism_type in ["museum", "gallery"]:
-            type_bonus = 1.5
-        elif tourism_type in ["attraction", "viewpoint"]:
-            type_bonus = 1.3
-    else:
-        type_bonus = 1.0
-    
-    # Combined score
-    total_score = (density_score * 1.5 + corridor_score * 3.0) * type_bonus
+    # Type bonus, gathered from the precomputed column
+    table = poi_table(pois)
+    poi_rows = [table.name_index[name.lower()] for name, node in zip(poi_names, nodes) if node is not None]
+    type_bonus = table.type_bonus[poi_rows]
     
-    return total_score
+    scores[found] = (density_score * 1.5 + corridor_score * 3.0) * type_bonus
+    return scores
+
 
+# Score-sorted candidates the greedy selection starts from; the rest are only sorted if it runs out
+SELECTION_HEAD_SIZE = MAX_ATTRACTIONS_PER_TOUR * 3
 
-def select_attractions_for_time_budget(G, pois, start_name, end_name, available_time_minutes):
+def _candidate_coords(G, names, node_cache):
+    """Names that resolve to a graph node, with the lat / lon arrays of their nodes."""
+    arrays = ensure_graph_arrays(G)
+    node_index = arrays["node_index"]
+    names = [name for name in names if node_cache.get(name.lower()) is not None]
+    rows = np.array([node_index[node_cache[name.lower()]] for name in names], dtype=np.int64)
+    return names, arrays["lat"][rows], arrays["lon"][rows]
+
+
+def select_attractions_for_time_budget(G, pois, start_name, end_name, available_time_minutes,
+                                       start_node=None, end_node=None, node_cache=None):
     """
     Select attractions that fit within the time budget between start and end.
     Uses greedy algorithm with scoring.
+    Pass start_node / end_node if the names are already resolved to graph nodes,
+    and node_cache (see build_poi_node_index) to share attraction nodes.
     Returns list of attraction names in visit order.
     """
-    start_node = nearest_node(G, pois, start_name)
-    end_node = nearest_node(G, pois, end_name)
+    if start_node is None:
+        start_node = nearest_node(G, pois, start_name)
+    if end_node is None:
+        end_node = nearest_node(G, pois, end_name)
     
     if start_node is None or end_node is None:
         return []
@@ -437,61 +877,78 @@ def select_attractions_for_time_budget(G, pois, start_name, end_name, available_
     if pois.empty or "name" not in pois.columns:
         return [start_name, end_name]
     
-    all_attractions = pois["name"].dropna().unique().tolist()
-    all_attractions = [a for a in all_attractions 
-                      if a.lower() != start_name.lower() and a.lower() != end_name.lower()]
+    name_lower = poi_table(pois).name_lower
+    mask = pois["name"].notna().to_numpy() & (name_lower != start_name.lower()) & (name_lower != end_name.lower())
+    all_attractions = pois.loc[mask, "name"].unique().tolist()
     
     # Score all attractions
     print(f"\n🎯 Scoring {len(all_attractions)} attractions...")
-    scored_attractions = []
-    for attr_name in all_attractions:
-        score = score_attraction(G, pois, attr_name, start_node, end_node)
-        if score >= MIN_ATTRACTION_SCORE:
-            scored_attractions.append((attr_name, score))
+    poi_index = build_poi_index(pois)
+    if node_cache is None:
+        node_cache = build_poi_node_index(G, pois)
+    scores = score_attractions(G, pois, all_attractions, start_node, end_node, poi_index, node_cache)
+    
+    # Keep good enough attractions, sorted by score (descending).
+    # The greedy walk rarely gets past the best few, so only the top
+    # SELECTION_HEAD_SIZE are sorted up front; the rest are sorted on demand.
+    keep = np.flatnonzero(scores >= MIN_ATTRACTION_SCORE)
+    print(f"✓ Found {len(keep)} high-quality attractions along route")
     
-    # Sort by score (descending)
-    scored_attractions.sort(key=lambda x: -x[1])
+    if len(keep) > SELECTION_HEAD_SIZE:
+        kth = np.partition(scores[keep], len(keep) - SELECTION_HEAD_SIZE)[len(keep) - SELECTION_HEAD_SIZE]
+        tail = keep[scores[keep] < kth]
+        keep = keep[scores[keep] >= kth]
+    else:
+        tail = keep[:0]
+    order = keep[np.argsort(-scores[keep], kind="stable")]
     
-    print(f"✓ Found {len(scored_attractions)} high-quality attractions along route")
+    # Greedy selection: pick attractions until time runs out.
+    # Walk the score-sorted candidates; from the current stop, the next pick is
+    # the first remaining candidate that is close enough and fits the time left.
+    # Candidates skipped on the way are never revisited, as in a one-pass greedy.
+    cand_names, cand_lat, cand_lon = _candidate_coords(
+        G, [all_attractions[i] for i in order], node_cache
+    )
+    
+    # Minutes per straight-line km, assuming walks are 1.3x the straight line
+    minutes_per_straight_km = estimate_time_minutes(1.3)
     
-    # Greedy selection: pick attractions until time runs out
     selected = [start_name]
-    current_node = start_node
+    current_lat, current_lon = get_node_coords(G, start_node)
     time_used = 0
+    pos = 0
     
-    for attr_name, score in scored_attractions:
-        if len(selected) >= MAX_ATTRACTIONS_PER_TOUR:
-            break
+    while len(selected) < MAX_ATTRACTIONS_PER_TOUR:
+        # Straight-line distance from the current stop to every remaining candidate
+        straight_dist = haversine_np(current_lat, current_lon, cand_lat[pos:], cand_lon[pos:])
         
-        # Get node for this attraction
-        attr_node = nearest_node(G, pois, attr_name)
-        if attr_node is None:
-            continue
+        # Estimated walk plus the visit
+        stop_time = straight_dist * minutes_per_straight_km + VISIT_TIME_PER_ATTRACTION_MIN
         
-        # Calculate travel time to this attraction
-        current_coords = get_node_coords(G, current_node)
-        attr_coords = get_node_coords(G, attr_node)
-        straight_dist = haversine(current_coords, attr_coords)
-        
-        # Skip if too far
-        if straight_dist > MAX_WALK_LEG_KM:
-            continue
-        
-        # Estimate actual walking distance (assume 1.3x straight line)
-        estimated_walk_dist = straight_dist * 1.3
-        travel_time = estimate_time_minutes(estimated_walk_dist)
-        
-        # Total time for this stop
-        stop_time = travel_time + VISIT_TIME_PER_ATTRACTION_MIN
-        
-        # Check if we have time
-        if time_used + stop_time > available_for_detours:
+        feasible = np.flatnonzero(
+            (straight_dist <= MAX_WALK_LEG_KM) & (time_used + stop_time <= available_for_detours)
+        )
+        if feasible.size == 0:
+            if len(tail) == 0:
+                break
+            # None of the top candidates fit: append the rest, still in score order
+            tail_order = tail[np.argsort(-scores[tail], kind="stable")]
+            tail_names, tail_lat, tail_lon = _candidate_coords(
+                G, [all_attractions[i] for i in tail_order], node_cache
+            )
+            cand_names.extend(tail_names)
+            cand_lat = np.concatenate([cand_lat, tail_lat])
+            cand_lon = np.concatenate([cand_lon, tail_lon])
+            tail = tail[:0]
             continue
         
         # Add to tour
-        selected.append(attr_name)
-        current_node = attr_node
-        time_used += stop_time
+        k = feasible[0]
+        pos += k
+        selected.append(cand_names[pos])
+        current_lat, current_lon = cand_lat[pos], cand_lon[pos]
+        time_used += stop_time[k]
+        pos += 1
     
     # Add destination
     selected.append(end_name)
@@ -499,16 +956,40 @@ def select_attractions_for_time_budget(G, pois, start_name, end_name, available_
     return selected
 
 
-def plan_time_based_tour(G, pois, start_name, end_name, available_time_minutes):
+def get_tour_index(G, pois):
+    """
+    City-level planning index: ({lowercased name: graph node}, per-node
+    attraction scores). Built on the first plan for a (graph, POIs) pair and
+    kept on G.graph, so later plans (other endpoints or budgets) reuse it.
+    """
+    arrays = ensure_graph_arrays(G)
+    cached = arrays.get("tour_index")
+    if cached is None or cached[0] is not pois:
+        node_cache = build_poi_node_index(G, pois)
+        node_attr = _NodeScores(build_node_attraction_scores(G, build_poi_index(pois), radius_km=0.4))
+        cached = (pois, node_cache, node_attr)
+        arrays["tour_index"] = cached
+    return cached[1], cached[2]
+
+
+def plan_time_based_tour(G, pois, start_name, end_name, available_time_minutes,
+                         max_expansions=MAX_A_STAR_EXPANSIONS, start_node=None, end_node=None):
     """
     Plan a complete tour based on available time from start to destination.
-    Returns: path, total_distance, total_time, itinerary, direct_comparison, stop_nodes
+    Each scenic leg is bounded by max_expansions and by the distance walkable in the time budget.
+    Pass start_node / end_node if the names are already resolved to graph nodes.
+    Returns: path (node id array), total_distance, total_time, itinerary, direct_comparison, stop_nodes
     """
     print(f"\n🕐 Planning tour for {available_time_minutes} minutes...")
     
+    # No single leg can be longer than what fits in the whole time budget
+    max_leg_km = min(MAX_WALK_LEG_KM, available_time_minutes / 60 * WALKING_SPEED_KMH)
+    
     # Get start and end nodes
-    start_node = nearest_node(G, pois, start_name)
-    end_node = nearest_node(G, pois, end_name)
+    if start_node is None:
+        start_node = nearest_node(G, pois, start_name)
+    if end_node is None:
+        end_node = nearest_node(G, pois, end_name)
     
     if start_node is None or end_node is None:
         return None, None, None, None, None, None
@@ -518,9 +999,14 @@ def plan_time_based_tour(G, pois, start_name, end_name, available_time_minutes):
     direct_path, direct_dist = direct_route(G, start_node, end_node)
     direct_time = estimate_time_minutes(direct_dist) if direct_dist else None
     
+    # Every attraction's nearest node and the per-node attraction scores,
+    # shared by scoring, selection and routing (and by later plans for this city)
+    node_cache, node_attr = get_tour_index(G, pois)
+    
     # Select attractions
     selected_attractions = select_attractions_for_time_budget(
-        G, pois, start_name, end_name, available_time_minutes
+        G, pois, start_name, end_name, available_time_minutes,
+        start_node=start_node, end_node=end_node, node_cache=node_cache,
     )
     
     if len(selected_attractions) < 2:
@@ -534,20 +1020,41 @@ def plan_time_based_tour(G, pois, start_name, end_name, available_time_minutes):
     # Route between attractions
     print(f"\n🗺️ Calculating scenic routes...\n")
     
-    full_path = []
+    # Resolve every stop to a graph node once (inner stops are shared by two legs)
+    stop_node_list = [start_node]
+    stop_node_list.extend(node_cache.get(name.lower()) for name in selected_attractions[1:-1])
+    stop_node_list.append(end_node)
+    
+    leg_arrays = []  # Node ids of each routed leg, joined into the full path at the end
     total_dist = 0.0
     total_time = 0.0
     total_attr = 0
     itinerary = []
     stop_nodes = []  # Store nodes for each stop
     
-    for i in range(len(selected_attractions) - 1):
-        leg_start_name = selected_attractions[i]
-        leg_end_name = selected_attractions[i + 1]
-        
-        leg_start_node = nearest_node(G, pois, leg_start_name)
-        leg_end_node = nearest_node(G, pois, leg_end_name)
-        
+    # Legs are independent: search them all up front, in parallel when the kernel is compiled
+    leg_nodes = list(pairwise(stop_node_list))
+    def route_leg(nodes):
+        return _route_tour_leg(G, *nodes, node_attr, max_expansions, max_leg_km)
+    
+    if NUMBA_AVAILABLE and SCENIC_LEG_WORKERS > 1 and len(leg_nodes) > 1:
+        leg_routes = list(_leg_pool.map(route_leg, leg_nodes))
+    else:
+        leg_routes = [route_leg(nodes) for nodes in leg_nodes]
+    
+    # Selection budgets with straight-line estimates; drop the last inner stop
+    # until the routed walk and visits fit the time left after the buffer
+    effective_time = available_time_minutes * (1 - BUFFER_TIME_PERCENT)
+    while len(selected_attractions) > 2 and _routed_tour_minutes(leg_routes) > effective_time:
+        print(f"  ⚠ Routed tour exceeds {available_time_minutes} min, dropping {selected_attractions[-2]}")
+        del selected_attractions[-2]
+        del stop_node_list[-2]
+        leg_routes[-2:] = [route_leg(stop_node_list[-2:])]
+    
+    # Walk consecutive (name, node) stop pairs
+    stops = zip(selected_attractions, stop_node_list)
+    
+    for i, ((leg_start_name, leg_start_node), (leg_end_name, leg_end_node)) in enumerate(pairwise(stops)):
         if leg_start_node is None or leg_end_node is None:
             print(f"⚠ Skipping leg {leg_start_name} → {leg_end_name}")
             continue
@@ -559,22 +1066,11 @@ def plan_time_based_tour(G, pois, start_name, end_name, available_time_minutes):
         
         print(f"  Leg {i+1}: {leg_start_name} → {leg_end_name}")
         
-        # Calculate scenic route
-        leg_path, leg_dist, leg_attr = scenic_a_star(
-            G,
-            leg_start_node,
-            leg_end_node,
-            pois,
-            attraction_weight=ATTRACTION_WEIGHT,
-            max_iterations=30000,
-            max_distance_km=MAX_WALK_LEG_KM,
-        )
+        leg_path, leg_dist, leg_attr, straight = leg_routes[i]
         
         if leg_path is None:
             # Fallback: straight line estimate
-            start_coords = get_node_coords(G, leg_start_node)
-            end_coords = get_node_coords(G, leg_end_node)
-            leg_dist = haversine(start_coords, end_coords)
+            leg_dist = straight
             leg_attr = 0
             print(f"    ⚠ Using straight-line estimate: {leg_dist:.2f} km")
         else:
@@ -591,11 +1087,11 @@ def plan_time_based_tour(G, pois, start_name, end_name, available_time_minutes):
         
         leg_time = walk_time + visit_time
         
-        # Add to totals
-        if leg_path and full_path:
-            full_path.extend(leg_path[1:])
+        # Add to totals (each leg after the first repeats the previous leg's last node)
+        if leg_path and leg_arrays:
+            leg_arrays.append(np.asarray(leg_path[1:], dtype=np.int64))
         elif leg_path:
-            full_path.extend(leg_path)
+            leg_arrays.append(np.asarray(leg_path, dtype=np.int64))
         
         total_dist += leg_dist
         total_time += leg_time
@@ -606,6 +1102,8 @@ def plan_time_based_tour(G, pois, start_name, end_name, available_time_minutes):
     if not itinerary:
         return None, None, None, None, None, None
     
+    full_path = np.concatenate(leg_arrays) if leg_arrays else np.empty(0, dtype=np.int64)
+    
     # Prepare comparison data
     direct_comparison = {
         'path': direct_path,
@@ -620,6 +1118,17 @@ def plan_time_based_tour(G, pois, start_name, end_name, available_time_minutes):
 # SECTION 5: VISUALIZATION
 # ==========================================
 
+def simplify_lonlat(lonlat, tolerance=ROUTE_SIMPLIFY_TOLERANCE_DEG):
+    """
+    Douglas-Peucker simplification of an (n, 2) route polyline for drawing.
+    Keeps both end points; straight runs of street nodes collapse to their corners.
+    """
+    if len(lonlat) < 3:
+        return lonlat
+    line = shapely.linestrings(lonlat)
+    return shapely.get_coordinates(shapely.simplify(line, tolerance, preserve_topology=False))
+
+
 def visualize_tour_interactive(
     G,
     scenic_path,
@@ -640,14 +1149,15 @@ def visualize_tour_interactive(
     - Markers with labels for each stop
     - Scenic path and direct path drawn
     """
+    import folium  # only needed when a map is actually drawn
 
     print("\n📍 Generating interactive map (folium)...")
 
-    if scenic_path and len(scenic_path) > 0:
+    if scenic_path is not None and len(scenic_path) > 0:
         # Center map on the middle of scenic path
         mid_idx = len(scenic_path) // 2
         center_node = scenic_path[mid_idx]
-    elif direct_path and len(direct_path) > 0:
+    elif direct_path is not None and len(direct_path) > 0:
         mid_idx = len(direct_path) // 2
         center_node = direct_path[mid_idx]
     else:
@@ -658,44 +1168,43 @@ def visualize_tour_interactive(
             print("⚠ No path or stops to visualize.")
             return
 
-    center_lat = G.nodes[center_node]["y"]
-    center_lon = G.nodes[center_node]["x"]
+    center_lat, center_lon = get_node_coords(G, center_node)
+
+    # Look up each stop's coordinates once, outside the marker loop
+    stop_lonlat = get_nodes_lonlat(G, [node for _, node in stop_nodes]).tolist()
 
     # Create base map
     m = folium.Map(location=[center_lat, center_lon], zoom_start=DEFAULT_MAP_ZOOM, tiles=MAP_TILES)
 
     # --- Plot direct route (blue dashed) ---
-    if direct_path and len(direct_path) > 1:
-        direct_coords = [
-            (G.nodes[n]["y"], G.nodes[n]["x"]) for n in direct_path
-        ]
+    if direct_path is not None and len(direct_path) > 1:
+        direct_lonlat = simplify_lonlat(get_nodes_lonlat(G, direct_path))
+        direct_coords = direct_lonlat[:, ::-1].tolist()  # Folium wants (lat, lon)
         folium.PolyLine(
             direct_coords,
             color="blue",
             weight=3,
             opacity=0.6,
+            smooth_factor=ROUTE_SMOOTH_FACTOR,
             dash_array="5, 10",
             tooltip="Direct route",
         ).add_to(m)
 
     # --- Plot scenic route (red solid) ---
-    if scenic_path and len(scenic_path) > 1:
-        scenic_coords = [
-            (G.nodes[n]["y"], G.nodes[n]["x"]) for n in scenic_path
-        ]
+    if scenic_path is not None and len(scenic_path) > 1:
+        scenic_lonlat = simplify_lonlat(get_nodes_lonlat(G, scenic_path))
+        scenic_coords = scenic_lonlat[:, ::-1].tolist()  # Folium wants (lat, lon)
         folium.PolyLine(
             scenic_coords,
             color="red",
             weight=4,
             opacity=0.9,
+            smooth_factor=ROUTE_SMOOTH_FACTOR,
             tooltip="Scenic route",
         ).add_to(m)
 
     # --- Plot stops as markers with popups ---
-    for i, (stop_name, stop_node) in enumerate(stop_nodes):
-        lat = G.nodes[stop_node]["y"]
-        lon = G.nodes[stop_node]["x"]
-
+    for i, ((stop_name, _), (lon, lat)) in enumerate(zip(stop_nodes, stop_lonlat)):
         if i == 0:
             icon_color = "green"
             prefix = "Start"
@@ -781,8 +1290,9 @@ def run_standalone():
         print("❌ Starting point is required.")
         return None
     
-    # Verify starting point exists
-    if nearest_node(G, pois, start_name) is None:
+    # Verify starting point exists (resolved once, reused for planning)
+    start_node = nearest_node(G, pois, start_name)
+    if start_node is None:
         print("❌ Starting point not found. Please choose from the list above.")
         return None
 
@@ -793,8 +1303,9 @@ def run_standalone():
         print("❌ Destination is required.")
         return None
     
-    # Verify destination exists
-    if nearest_node(G, pois, end_name) is None:
+    # Verify destination exists (resolved once, reused for planning)
+    end_node = nearest_node(G, pois, end_name)
+    if end_node is None:
         print("❌ Destination not found. Please choose from the list above.")
         return None
     
@@ -827,7 +1338,8 @@ def run_standalone():
     print(f"   - Buffer time: {int(BUFFER_TIME_PERCENT * 100)}%")
     
     path, total_dist, total_time, itinerary, direct_comparison, stop_nodes = plan_time_based_tour(
-        G, pois, start_name, end_name, time_minutes
+        G, pois, start_name, end_name, time_minutes,
+        start_node=start_node, end_node=end_node,
     )
 
     if path is None or not itinerary:
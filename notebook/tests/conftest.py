@@ -0,0 +1,39 @@
+# ==========================================
+# TEST SETUP
+# The notebook modules are flat scripts; make them importable from tests/
+# ==========================================
+
+import os
+import sys
+
+import networkx as nx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_walk_graph(n=6, step=0.001):
+    """
+    Small OSMnx-style walk graph: a directed multigraph with every street in
+    both directions, plus a longer parallel edge on one street.
+    """
+    G = nx.MultiDiGraph(crs="epsg:4326")
+    for i in range(n):
+        for j in range(n):
+            G.add_node(i * n + j + 1, y=48.85 + i * step, x=2.33 + j * step)
+    for i in range(n):
+        for j in range(n):
+            u = i * n + j + 1
+            if j < n - 1:
+                G.add_edge(u, u + 1, length=74.0 + j)
+                G.add_edge(u + 1, u, length=74.0 + j)
+            if i < n - 1:
+                G.add_edge(u, u + n, length=95.8 + i)
+                G.add_edge(u + n, u, length=95.8 + i)
+    G.add_edge(1, 2, length=300.0)  # parallel, longer: never the routed one
+    return G
+
+
+@pytest.fixture
+def walk_graph():
+    return make_walk_graph()
@@ -0,0 +1,25 @@
+# ==========================================
+# APP HELPER TESTS
+# ==========================================
+
+from app import _msg_to_html
+
+
+def test_guide_markdown_is_rendered():
+    text = _msg_to_html({'role': 'guide', 'message': "Let's head to **Louvre**.\n\n🚶 **Distance:** 1.20 km"})
+    assert "<strong>Louvre</strong>" in text
+    assert "<strong>Distance:</strong>" in text
+    assert "**" not in text
+    assert "<br><br>" in text
+
+
+def test_guide_text_is_still_escaped():
+    text = _msg_to_html({'role': 'guide', 'message': "**<script>alert(1)</script>**"})
+    assert "<script>" not in text
+    assert "<strong>&lt;script&gt;" in text
+
+
+def test_user_text_is_escaped_verbatim():
+    text = _msg_to_html({'role': 'user', 'message': "what about **this** <b>x</b>?"})
+    assert "**this**" in text
+    assert "&lt;b&gt;x&lt;/b&gt;" in text
@@ -0,0 +1,83 @@
+# ==========================================
+# CITY CACHE TESTS
+# ==========================================
+
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+from city_cache import edges_to_csr, graph_to_arrays, load_city_graph, save_city
+
+
+def csr_path_km(csr, node_ids, source, target):
+    """Shortest path length in km between two node ids on a CSR adjacency."""
+    rows = {node: i for i, node in enumerate(node_ids.tolist())}
+    dist = dijkstra(csr, directed=False, indices=rows[source])
+    return dist[rows[target]]
+
+
+def nx_path_km(G, source, target):
+    """Sum of the edge `length` values along networkx's shortest path, in km."""
+    path = nx.shortest_path(G, source, target, weight="length")
+    return sum(min(d["length"] for d in G[u][v].values()) for u, v in zip(path, path[1:])) / 1000.0
+
+
+def test_csr_keeps_one_length_per_street(walk_graph):
+    G = walk_graph
+    nodes, edges = graph_to_arrays(G)
+    csr = edges_to_csr(nodes, edges)
+
+    node_ids = nodes["id"].astype(np.int64)
+    rows = {node: i for i, node in enumerate(node_ids.tolist())}
+    assert csr[rows[1], rows[2]] == np.float64(np.float32(74.0)) / 1000.0
+    assert csr[rows[2], rows[1]] == csr[rows[1], rows[2]]
+    assert csr[rows[1], rows[7]] == np.float64(np.float32(95.8)) / 1000.0
+
+
+def test_csr_path_length_matches_edge_lengths(walk_graph, tmp_path):
+    G = walk_graph
+    expected = nx_path_km(G, 1, 36)
+
+    nodes, edges = graph_to_arrays(G)
+    fresh = edges_to_csr(nodes, edges)
+    assert np.isclose(csr_path_km(fresh, nodes["id"], 1, 36), expected, rtol=1e-6)
+
+    path = str(tmp_path / "city.bundle")
+    pois = gpd.GeoDataFrame({"name": []}, geometry=[], crs="epsg:4326")
+    save_city(path, G, pois)
+    loaded = load_city_graph(path)
+    assert np.isclose(
+        csr_path_km(loaded.graph["csr"], loaded.graph["node_ids"], 1, 36), expected, rtol=1e-6
+    )
+
+
+def test_legacy_pickles_are_migrated_to_a_bundle(walk_graph, tmp_path):
+    import pickle
+
+    from shapely.geometry import Point
+
+    from city_cache import city_cache_path, legacy_cache_paths, load_city, migrate_legacy_city
+
+    G = nx.Graph(walk_graph)  # older releases pickled the undirected graph
+    pois = gpd.GeoDataFrame(
+        {"name": ["Louvre", None], "tourism": ["museum", "artwork"], "fixme": ["x", "y"]},
+        geometry=[Point(2.33, 48.85), Point(2.331, 48.851)],
+        crs="EPSG:4326",
+    )
+    graph_pkl, pois_pkl = legacy_cache_paths(str(tmp_path), "Paris, France")
+    assert migrate_legacy_city(str(tmp_path), "Paris, France") is None
+
+    with open(graph_pkl, "wb") as f:
+        pickle.dump(G, f)
+    with open(pois_pkl, "wb") as f:
+        pickle.dump(pois, f)
+
+    path = migrate_legacy_city(str(tmp_path), "Paris, France")
+    assert path == city_cache_path(str(tmp_path), "Paris, France")
+
+    G2, pois2 = load_city(path)
+    assert sorted(G2.nodes) == sorted(G.nodes)
+    assert pois2["name"].tolist() == ["Louvre"]
+    assert "fixme" not in pois2.columns
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".tmp"] == []
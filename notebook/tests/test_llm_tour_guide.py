@@ -0,0 +1,79 @@
+# ==========================================
+# LLM TOUR GUIDE TESTS
+# ==========================================
+
+from collections import OrderedDict
+
+import diskcache
+import pytest
+
+import llm_tour_guide
+
+
+class FakeModel:
+    """Gemini stand-in returning the queued texts, one per call."""
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        text = self.texts.pop(0)
+        if stream:
+            return [type("Chunk", (), {"text": text})()]
+        return type("Response", (), {"text": text})()
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch, tmp_path):
+    def install(*texts):
+        model = FakeModel(texts)
+        monkeypatch.setattr(llm_tour_guide, "_get_gemini_model", lambda name: model)
+        return model
+
+    monkeypatch.setattr(llm_tour_guide, "_llm_cache", OrderedDict())
+    disk = diskcache.Cache(str(tmp_path / "llm"))
+    monkeypatch.setattr(llm_tour_guide, "_llm_disk_cache", disk)
+    yield install
+    disk.close()
+
+
+@pytest.mark.parametrize("generate", [
+    llm_tour_guide._cached_generate,
+    lambda model_name, prompt: "".join(llm_tour_guide._stream_generate(model_name, prompt)).strip(),
+])
+def test_empty_text_is_not_cached(fake_gemini, generate):
+    model = fake_gemini("  ", "Musée d'Orsay")
+
+    assert generate("m", "describe") == ""
+    assert llm_tour_guide._cache_get(("m", "describe")) is None
+    assert len(llm_tour_guide._llm_disk_cache) == 0
+
+    assert generate("m", "describe") == "Musée d'Orsay"
+    assert generate("m", "describe") == "Musée d'Orsay"
+    assert model.calls == 2
+
+
+def test_empty_cached_text_is_a_miss(fake_gemini):
+    key = ("m", "describe")
+    llm_tour_guide._llm_disk_cache.set(llm_tour_guide._disk_key(key), "")
+    fake_gemini("Louvre")
+
+    assert llm_tour_guide._cache_get(key) is None
+    assert llm_tour_guide._cached_generate(*key) == "Louvre"
+
+
+@pytest.mark.parametrize("question, answer_start", [
+    ("Is photography allowed?", "📸"),
+    ("Where can we go eating nearby?", "🍽️"),
+    ("Is it pricey?", "💰"),
+    ("What's the price and how long does it take?", "⏰"),
+    ("PICTURES or food first?", "📸"),
+])
+def test_fallback_answer_topics(monkeypatch, question, answer_start):
+    import pandas as pd
+
+    monkeypatch.setattr(llm_tour_guide, "GEMINI_API_KEY", "")
+    guide = llm_tour_guide.TourGuideAgent("Paris, France", [], pd.DataFrame())
+    assert guide.answer_question(question, "Louvre").startswith(answer_start)
@@ -0,0 +1,144 @@
+# ==========================================
+# PATH PLANNING TESTS
+# ==========================================
+
+import numpy as np
+import pytest
+
+from city_cache import ensure_adjacency, ensure_graph_arrays
+from config import ATTRACTION_WEIGHT, HEURISTIC_WEIGHT
+from path_planning import (
+    _scenic_a_star_kernel, _scenic_a_star_python, get_node_coords, haversine_np,
+)
+
+
+def path_length_km(G, path):
+    """Sum of the shortest parallel edge `length` along a node-id path, in km."""
+    return sum(min(d["length"] for d in G[u][v].values()) for u, v in zip(path, path[1:])) / 1000.0
+
+
+@pytest.mark.parametrize("attraction_weight, max_distance_km", [
+    (0.0, np.inf),
+    (ATTRACTION_WEIGHT, 3.0),
+    (ATTRACTION_WEIGHT, 1.0),
+])
+def test_kernel_matches_python_search(walk_graph, attraction_weight, max_distance_km):
+    G = walk_graph
+    arrays = ensure_graph_arrays(G)
+    node_ids = arrays["node_ids"]
+    node_index = arrays["node_index"]
+
+    # A few scenic nodes off the direct line
+    node_attr = np.zeros(len(node_ids), dtype=np.int64)
+    for node, score in ((8, 3), (15, 2), (22, 1), (29, 2)):
+        node_attr[node_index[node]] = score
+
+    start, goal = node_index[1], node_index[36]
+    goal_lat, goal_lon = get_node_coords(G, 36)
+    h_to_goal = haversine_np(arrays["lat"], arrays["lon"], goal_lat, goal_lon)
+
+    csr = arrays["csr"]
+    k_rows, k_dist, k_attr = _scenic_a_star_kernel(
+        start, goal, csr.indptr, csr.indices, csr.data, node_ids,
+        h_to_goal, node_attr,
+        float(attraction_weight), float(HEURISTIC_WEIGHT), float(max_distance_km), 30000,
+    )
+    p_rows, p_dist, p_attr = _scenic_a_star_python(
+        start, goal, ensure_adjacency(G), node_ids.tolist(),
+        h_to_goal.tolist(), node_attr.tolist(),
+        attraction_weight, HEURISTIC_WEIGHT, max_distance_km, 30000,
+    )
+
+    assert list(k_rows) == list(p_rows)
+    assert k_attr == p_attr
+    assert np.isclose(k_dist, p_dist)
+
+    # Both report the walked distance along the graph's own edge lengths
+    if len(p_rows):
+        assert np.isclose(p_dist, path_length_km(G, node_ids[p_rows].tolist()), rtol=1e-6)
+        assert p_dist <= max_distance_km
+
+
+def make_tour_city():
+    """12 x 12 walk graph with a row of attractions on its diagonal band."""
+    import geopandas as gpd
+    from shapely.geometry import Point
+
+    from conftest import make_walk_graph
+
+    G = make_walk_graph(n=12)
+    stops = [1, 14, 30, 47, 61, 78, 90, 103, 117, 130, 144]
+    names = [f"Stop {node}" for node in stops]
+    pois = gpd.GeoDataFrame(
+        {"name": names, "tourism": ["museum", "attraction", "artwork"] * 3 + ["museum", "viewpoint"]},
+        geometry=[Point(G.nodes[node]["x"], G.nodes[node]["y"]) for node in stops],
+        crs="EPSG:4326",
+    )
+    return G, pois, names
+
+
+@pytest.mark.parametrize("available_time_minutes", [45, 60, 90])
+def test_planned_tour_fits_time_budget(available_time_minutes):
+    from config import BUFFER_TIME_PERCENT
+    from path_planning import plan_time_based_tour
+
+    G, pois, names = make_tour_city()
+    result = plan_time_based_tour(G, pois, names[0], names[-1], available_time_minutes)
+    total_time = result[2]
+
+    assert total_time is not None
+    assert total_time <= available_time_minutes * (1 - BUFFER_TIME_PERCENT)
+
+
+def test_leg_cache_does_not_keep_graph_alive():
+    import gc
+    import weakref
+
+    from path_planning import plan_time_based_tour
+
+    G, pois, names = make_tour_city()
+    plan_time_based_tour(G, pois, names[0], names[-1], 90)
+    assert len(G.graph["scenic_leg_cache"]) > 0
+
+    graph_ref = weakref.ref(G)
+    del G
+    gc.collect()
+    assert graph_ref() is None
+
+
+def test_batched_scores_match_per_attraction_scores():
+    import geopandas as gpd
+    from shapely.geometry import Point
+
+    from conftest import make_walk_graph
+    from config import TOURISM_TYPE_BONUS
+    from path_planning import haversine, nearest_node, score_attractions
+
+    G = make_walk_graph(n=12, step=0.002)
+    rng = np.random.default_rng(0)
+    names = [f"Place {k}" for k in range(40)]
+    pois = gpd.GeoDataFrame(
+        {"name": names, "tourism": ["museum", "attraction", "viewpoint", "gallery", "artwork"] * 8},
+        geometry=[Point(2.33 + x, 48.85 + y) for x, y in rng.uniform(0, 0.022, (40, 2))],
+        crs="EPSG:4326",
+    )
+    start, end = nearest_node(G, pois, names[0]), nearest_node(G, pois, names[-1])
+
+    def per_attraction_score(name):
+        """One attraction at a time: density, corridor and type bonus."""
+        node = nearest_node(G, pois, name)
+        node_coords = get_node_coords(G, node)
+        density = sum(haversine(node_coords, (p.y, p.x)) <= 0.5 for p in pois.geometry)
+
+        start_coords, end_coords = get_node_coords(G, start), get_node_coords(G, end)
+        detour = (haversine(start_coords, node_coords) + haversine(node_coords, end_coords)
+                  - haversine(start_coords, end_coords))
+        corridor = 3.0 if detour < 0.5 else 2.0 if detour < 1.0 else 1.0 if detour < 2.0 else 0.3
+
+        tourism = pois.loc[pois["name"] == name, "tourism"].iloc[0]
+        return (density * 1.5 + corridor * 3.0) * TOURISM_TYPE_BONUS.get(tourism, 1.0)
+
+    batched = score_attractions(G, pois, names + ["Nowhere"], start, end)
+
+    assert np.allclose(batched[:-1], [per_attraction_score(name) for name in names], rtol=1e-6)
+    assert batched[-1] == 0